@@ -1,5 +1,8 @@
 from flask import Flask
 from .extensions import db, login_manager, mail, migrate
+from .db_routing import init_db_routing
+from .permissions import init_permissions
+from .mailer import init_mail_resilience
 
 
 def create_app(test_config=None) -> Flask:
@@ -9,18 +12,51 @@ def create_app(test_config=None) -> Flask:
     app.config.from_object('config.Config')
     if test_config:
         app.config.update(test_config)
+    if app.config.get('ASYNC_VIEWS') and app.config.get('USER_SHARD_URIS'):
+        # Асинхронные представления читают пользователей только из основной БД
+        raise ValueError("ASYNC_VIEWS не поддерживает шардирование пользователей (USER_SHARD_URIS)")
 
     db.init_app(app)
+    init_db_routing(app)
     login_manager.init_app(app)
     login_manager.login_view = 'user.login'  # Отправление незалогиненного пользователя на страницу входа
     login_manager.login_message_category = 'info'  # Тип сообщения info
     mail.init_app(app)
+    init_mail_resilience(app)
+    init_permissions(app)
+
+    from .audit import init_audit
+    from .activity import init_activity
+    from .tokens import init_tokens
+    from .sharding import init_sharding
+    from .health import init_health
+    from .singleflight import init_single_flight
+    init_sharding(app)
+    init_audit(app)
+    init_activity(app)
+    init_tokens(app)
+    init_single_flight(app)
+    init_health(app)
 
     # Подключение маршрутов к приложению
     from .routes import main_bp, user_bp
+    if app.config.get('ASYNC_VIEWS'):
+        # Асинхронные представления работают поверх движка aiosqlite
+        from .async_db import init_async_db
+        from .async_routes import user_bp
+        init_async_db(app)
     app.register_blueprint(main_bp)
     app.register_blueprint(user_bp)
 
+    from .admin import admin_bp
+    app.register_blueprint(admin_bp)
+
     migrate.init_app(app, db)
 
+    # Сжатие оборачивает wsgi_app последним, чтобы видеть готовые ответы
+    from .assets import init_assets
+    from .compression import init_compression
+    init_assets(app)
+    init_compression(app)
+
     return app
@@ -0,0 +1,143 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Flask, current_app
+from sqlalchemy import bindparam, update
+
+from .background import BackgroundFlusher
+from .models import User
+from .sharding import engines_for_user_ids
+
+
+class ActivityTracker(BackgroundFlusher):
+    """Отслеживает last_seen_at и last_login_at без записи в БД на каждый запрос.
+
+    Отметки копятся в памяти (повторные отметки одного пользователя схлопываются),
+    а фоновый поток раз в ACTIVITY_FLUSH_INTERVAL_SECONDS пишет их одним массовым UPDATE.
+    last_seen_at пишется не чаще раза в ACTIVITY_DEBOUNCE_SECONDS на пользователя,
+    вход записывается при ближайшем сбросе.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        super().__init__(app, app.config['ACTIVITY_FLUSH_INTERVAL_SECONDS'], 'activity-tracker')
+        self.debounce = app.config['ACTIVITY_DEBOUNCE_SECONDS']
+        self._lock = threading.Lock()
+        self._dirty: dict[int, dict] = {}  # user_id -> {'last_seen_at': ..., 'last_login_at': ...}
+        self._written_at: dict[int, float] = {}  # user_id -> время последней записи (monotonic)
+
+        self.touches = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_last = 0.0
+        self.flush_seconds_max = 0.0
+
+    def touch(self, user_id: int, login: bool = False) -> None:
+        """Отмечает активность пользователя в памяти"""
+
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self.touches += 1
+            entry = self._dirty.setdefault(user_id, {})
+            entry['last_seen_at'] = now
+            if login:
+                entry['last_login_at'] = now
+        self.wake()
+
+    def has_pending(self) -> bool:
+        return bool(self._dirty)
+
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def _take_due(self, force: bool) -> list[dict]:
+        """Забирает из грязного набора записи, которые пора писать; вызывается под блокировкой.
+        Время записи отмечается только после успешного UPDATE"""
+
+        now = time.monotonic()
+        due = []
+        for user_id, entry in list(self._dirty.items()):
+            written_at = self._written_at.get(user_id)
+            if force or 'last_login_at' in entry or written_at is None or now - written_at >= self.debounce:
+                due.append({'b_id': user_id, **entry})
+                del self._dirty[user_id]
+        # Старые отметки больше не влияют на дебаунс
+        for user_id, written_at in list(self._written_at.items()):
+            if now - written_at >= self.debounce and user_id not in self._dirty:
+                del self._written_at[user_id]
+        return due
+
+    def flush(self, force: bool = False) -> None:
+        """Пишет накопленные отметки; force=True игнорирует дебаунс"""
+
+        # При остановке процесса пишем все, что осталось, не дожидаясь окна дебаунса
+        force = force or self._stopped.is_set()
+        with self._lock:
+            due = self._take_due(force)
+        if not due:
+            return
+
+        started = time.perf_counter()
+        table = User.__table__
+        by_id = {row['b_id']: row for row in due}
+        try:
+            for engine, user_ids in engines_for_user_ids(by_id).items():
+                logins = [by_id[user_id] for user_id in user_ids if 'last_login_at' in by_id[user_id]]
+                seen = [by_id[user_id] for user_id in user_ids if 'last_login_at' not in by_id[user_id]]
+                with engine.begin() as conn:
+                    if logins:
+                        conn.execute(update(table).where(table.c.id == bindparam('b_id')).values(
+                            last_seen_at=bindparam('last_seen_at'), last_login_at=bindparam('last_login_at')), logins)
+                    if seen:
+                        conn.execute(update(table).where(table.c.id == bindparam('b_id')).values(
+                            last_seen_at=bindparam('last_seen_at')), seen)
+                written_at = time.monotonic()
+                with self._lock:
+                    for user_id in user_ids:
+                        self._written_at[user_id] = written_at
+                        del by_id[user_id]
+        except Exception:
+            self._requeue(by_id.values())
+            raise
+        elapsed = time.perf_counter() - started
+
+        self.rows_written += len(due)
+        self.flushes += 1
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_last = elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    def _requeue(self, rows) -> None:
+        """Возвращает незаписанные отметки в грязный набор, не затирая более новые"""
+
+        with self._lock:
+            for row in rows:
+                entry = self._dirty.setdefault(row['b_id'], {})
+                for key in ('last_seen_at', 'last_login_at'):
+                    if key in row:
+                        entry.setdefault(key, row[key])
+
+    def metrics(self) -> dict:
+        """Счетчики для мониторинга: коэффициент схлопывания и задержка сброса"""
+
+        return {
+            'touches': self.touches,
+            'rows_written': self.rows_written,
+            'pending': self.pending(),
+            'coalescing_ratio': self.touches / self.rows_written if self.rows_written else None,
+            'flushes': self.flushes,
+            'flush_ms_last': self.flush_seconds_last * 1000,
+            'flush_ms_max': self.flush_seconds_max * 1000,
+            'flush_ms_avg': self.flush_seconds_total / self.flushes * 1000 if self.flushes else None,
+        }
+
+
+def init_activity(app: Flask) -> None:
+    app.extensions['activity'] = ActivityTracker(app)
+
+
+def track_activity(user: User, login: bool = False) -> None:
+    """Отмечает, что пользователь активен (и вошел, если login=True)"""
+
+    current_app.extensions['activity'].touch(user.id, login=login)
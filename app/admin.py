@@ -0,0 +1,125 @@
+import csv
+import io
+import sys
+
+from flask import Blueprint, Response, jsonify, render_template, request, stream_with_context, url_for
+from sqlalchemy import and_, select, union
+
+from .models import User
+from .permissions import Permission, permission_required
+from .sharding import user_session
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 1000
+USER_FIELDS = ('id', 'username', 'email', 'is_confirmed', 'role')
+
+
+def prefix_range(column, prefix: str):
+    """Условие "начинается с prefix" в виде диапазона, чтобы SQLite использовал индекс по столбцу.
+    LIKE 'abc%' индекс не использует, а column >= 'abc' AND column < 'abd' — использует"""
+
+    # Последний символ, который можно увеличить: у U+10FFFF следующего нет
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return column >= prefix
+    code = ord(stem[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000  # Суррогаты не кодируются в UTF-8
+    return and_(column >= prefix, column < stem[:-1] + chr(code))
+
+
+def select_users_page(q: str = '', is_confirmed: bool | None = None, role: str | None = None,
+                      after: int = 0, limit: int = PAGE_SIZE):
+    """Запрос страницы пользователей с keyset-пагинацией: WHERE id > after ORDER BY id LIMIT limit.
+    В отличие от OFFSET, стоимость не растет с номером страницы"""
+
+    stmt = select(User).where(User.id > after).order_by(User.id).limit(limit)
+    if q:
+        # Кандидаты выбираются по индексам username/email, иначе SQLite идет по первичному ключу
+        # ради ORDER BY id и просматривает всю таблицу при редком префиксе
+        matches = union(
+            select(User.id).where(prefix_range(User.username, q)),
+            select(User.id).where(prefix_range(User.email, q)),
+        )
+        stmt = stmt.where(User.id.in_(matches.scalar_subquery()))
+    if is_confirmed is not None:
+        stmt = stmt.where(User.is_confirmed == is_confirmed)
+    if role:
+        stmt = stmt.where(User.role == role)
+    return stmt
+
+
+def fetch_page(stmt, limit: int, scalars: bool = True) -> list:
+    """Выполняет запрос страницы. При шардировании каждый шард отдает до limit строк с id > after,
+    поэтому первые limit строк после слияния по id — правильная глобальная страница"""
+
+    result = user_session().execute(stmt)
+    rows = result.scalars().all() if scalars else result.all()
+    return sorted(rows, key=lambda row: row.id)[:limit]
+
+
+def user_to_dict(user: User) -> dict:
+    return {field: getattr(user, field) for field in USER_FIELDS}
+
+
+def parse_filters() -> dict:
+    """Читает фильтры поиска из строки запроса"""
+
+    confirmed = request.args.get('is_confirmed')
+    return {
+        'q': request.args.get('q', '').strip(),
+        'is_confirmed': None if confirmed in (None, '') else confirmed in ('1', 'true'),
+        'role': request.args.get('role') or None,
+    }
+
+
+@admin_bp.route('/users')
+@permission_required(Permission.MANAGE_USERS)
+def users():
+    """Список пользователей с поиском и фильтрами, HTML или JSON (?format=json)"""
+
+    filters = parse_filters()
+    after = request.args.get('after', 0, type=int)
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+    page = fetch_page(select_users_page(after=after, limit=limit, **filters), limit)
+    next_after = page[-1].id if len(page) == limit else None
+
+    if request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json':
+        return jsonify(users=[user_to_dict(user) for user in page], next_after=next_after)
+
+    next_url = None
+    if next_after is not None:
+        next_url = url_for('admin.users', **{**request.args.to_dict(), 'after': next_after})
+    return render_template('admin_users.html', users=page, filters=filters, next_url=next_url)
+
+
+@admin_bp.route('/users.csv')
+@permission_required(Permission.MANAGE_USERS)
+def export_users():
+    """Потоковая выгрузка пользователей в CSV пачками по EXPORT_BATCH_SIZE без загрузки всей таблицы в память"""
+
+    filters = parse_filters()
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(USER_FIELDS)
+        after = 0
+        while True:
+            stmt = select_users_page(after=after, limit=EXPORT_BATCH_SIZE, **filters)
+            rows = fetch_page(stmt.with_only_columns(*(getattr(User, f) for f in USER_FIELDS)), EXPORT_BATCH_SIZE,
+                              scalars=False)
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            if len(rows) < EXPORT_BATCH_SIZE:
+                break
+            after = rows[-1].id
+
+    return Response(stream_with_context(generate()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=users.csv'})
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+
+from flask import Flask, request
+from werkzeug.security import safe_join
+
+# Имя параметра с хэшем содержимого в URL статики: /static/app.css?v=<хэш>
+VERSION_ARG = 'v'
+
+
+class StaticHashes:
+    """Хэши содержимого статических файлов. Файл перечитывается, только если изменились
+    его mtime или размер, поэтому url_for('static', ...) не читает файл на каждый вызов"""
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+        self._hashes: dict[str, tuple[tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> str | None:
+        path = safe_join(self.app.static_folder, filename) if self.app.static_folder else None
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._hashes.get(filename)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with open(path, 'rb') as file:
+            digest = hashlib.blake2b(file.read(), digest_size=8).hexdigest()
+        with self._lock:
+            self._hashes[filename] = (signature, digest)
+        return digest
+
+
+def init_assets(app: Flask) -> None:
+    """Добавляет хэш содержимого в URL статики и отдает такие URL с долгим кэшированием"""
+
+    hashes = StaticHashes(app)
+    app.extensions['static_hashes'] = hashes
+    max_age = app.config['STATIC_MAX_AGE_SECONDS']
+
+    @app.url_defaults
+    def add_static_hash(endpoint, values):
+        if endpoint == 'static' and VERSION_ARG not in values and 'filename' in values:
+            digest = hashes.get(values['filename'])
+            if digest is not None:
+                values[VERSION_ARG] = digest
+
+    @app.after_request
+    def cache_hashed_static(response):
+        # Только при совпадении хэша: старый URL не должен надолго закэшировать новый файл
+        if (request.endpoint == 'static' and response.status_code in (200, 304)
+                and request.args.get(VERSION_ARG)
+                and request.args[VERSION_ARG] == hashes.get(request.view_args['filename'])):
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
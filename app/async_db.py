@@ -0,0 +1,45 @@
+import asyncio
+
+from flask import Flask, current_app
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from .models import User
+
+
+def to_async_uri(uri: str) -> str:
+    """Переводит синхронный адрес SQLite в адрес для драйвера aiosqlite"""
+
+    if uri.startswith('sqlite:') and not uri.startswith('sqlite+'):
+        return 'sqlite+aiosqlite:' + uri[len('sqlite:'):]
+    return uri
+
+
+def init_async_db(app: Flask) -> None:
+    """Создает асинхронный движок и фабрику сессий, сохраняет их в app.extensions"""
+
+    uri = app.config.get('ASYNC_SQLALCHEMY_DATABASE_URI') or to_async_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    # Flask запускает каждое async-представление в своем цикле событий,
+    # поэтому соединения aiosqlite нельзя переиспользовать между запросами
+    engine = create_async_engine(uri, poolclass=NullPool)
+    # Первое соединение инициализирует диалект под asyncio.Lock, привязанным к циклу событий.
+    # Если оно случится в одновременных запросах, их циклы ждут блокировку друг друга вечно
+    asyncio.run(_first_connect(engine))
+    app.extensions['async_db'] = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def _first_connect(engine) -> None:
+    async with engine.connect():
+        pass
+
+
+def get_async_session() -> AsyncSession:
+    """Открывает новую асинхронную сессию для текущего приложения"""
+
+    return current_app.extensions['async_db']()
+
+
+async def get_user_by_email_async(db_session: AsyncSession, email: str) -> User | None:
+    stmt = select(User).where(User.email == email)
+    return (await db_session.execute(stmt)).scalars().first()
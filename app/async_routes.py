@@ -0,0 +1,301 @@
+import asyncio
+
+from flask import (Blueprint, request, redirect, url_for, flash,
+                   render_template, session)
+from flask_login import login_user, logout_user, current_user, login_required
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import select, or_
+
+from .models import User, RESET_TOKEN_SALT, CONFIRM_TOKEN_SALT
+from .async_db import get_async_session, get_user_by_email_async
+from .forms import RegistrationForm, LoginForm, RequestResetForm, ResetPasswordForm, RepeatEmailConfirmationForm
+from app.email_utils import send_reset_password_email, send_email_confirm_token, MAIL_DELAYED_MESSAGE
+from .audit import audit
+from .activity import track_activity
+from .tokens import consume_token
+from .singleflight import single_flight_async
+from datetime import datetime, timezone, timedelta
+
+# Асинхронный вариант пользовательского блупринта. Имя совпадает с синхронным,
+# поэтому url_for('user.*') и шаблоны работают без изменений.
+# Хэширование паролей и отправка писем блокируют поток, поэтому они выполняются
+# через asyncio.to_thread (контекст Flask копируется в поток вместе с contextvars)
+user_bp = Blueprint('user', __name__, url_prefix="/user")
+
+
+async def send_reset_to(email: str) -> bool | None:
+    """Отправляет письмо сброса пароля; None — пользователь не найден"""
+    async with get_async_session() as db_session:
+        user = await get_user_by_email_async(db_session, email)
+    if user is None:
+        return None
+    sent = await asyncio.to_thread(send_reset_password_email, user)
+    audit('reset_requested', user)
+    return sent
+
+
+async def send_confirmation_to(email: str) -> bool | None:
+    """Отправляет повторное письмо подтверждения; None — пользователь не найден"""
+    async with get_async_session() as db_session:
+        user = await get_user_by_email_async(db_session, email)
+    if user is None:
+        return None
+    return await asyncio.to_thread(send_email_confirm_token, user)
+
+
+@user_bp.route('register', methods=['GET', 'POST'])
+async def register():
+    """Обрабатывает страницу регистрации пользователя"""
+
+    form = RegistrationForm()
+
+    if form.validate_on_submit():
+        async with get_async_session() as db_session:
+            stmt = select(User).where(
+                or_(
+                    User.username == form.username.data,
+                    User.email == form.email.data
+                )
+            )
+            try:
+                existing_user = (await db_session.execute(stmt)).scalars().first()
+            except SQLAlchemyError:
+                flash('Ошибка при регистрации. Попробуйте позже.', 'danger')
+                return redirect(url_for('user.register'))
+
+            if existing_user:
+                flash('Пользователь с таким именем или email уже существует', 'danger')
+                return redirect(url_for('user.register'))
+
+            new_user = User(
+                username=form.username.data,
+                email=form.email.data,
+            )
+            await asyncio.to_thread(new_user.set_password, form.password.data)
+            session['email'] = new_user.email
+
+            try:
+                db_session.add(new_user)
+                await db_session.commit()
+            except SQLAlchemyError:
+                await db_session.rollback()
+                flash('Ошибка при регистрации. Попробуйте позже.', 'danger')
+                return redirect(url_for('user.register'))
+
+        if await asyncio.to_thread(send_email_confirm_token, new_user):
+            flash('Регистрация прошла успешно! На вашу почту отправлено письмо для подтверждения.', 'success')
+        else:
+            flash('Регистрация прошла успешно! ' + MAIL_DELAYED_MESSAGE, 'warning')
+        session["last_confirmation_email"] = datetime.now(timezone.utc).isoformat()
+        return redirect(url_for('user.confirm_email_info'))
+
+    return render_template('register.html', form=form)
+
+
+@user_bp.route('login', methods=['GET', 'POST'])
+async def login():
+    """Проверяет форму по валидации, логинит пользователя"""
+
+    is_password_requested = session.get("is_password_reset_requested")
+
+    if current_user.is_authenticated:
+        return redirect(url_for('main.home'))
+
+    form = LoginForm()
+
+    if form.validate_on_submit():
+        try:
+            async with get_async_session() as db_session:
+                user = await get_user_by_email_async(db_session, form.email.data)
+        except SQLAlchemyError:
+            flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.")
+            return redirect(url_for("user.login"))
+
+        if user and await asyncio.to_thread(user.check_password, form.password.data):
+            if user.is_confirmed:
+                login_user(user, remember=form.remember.data)
+                audit('login', user)
+                track_activity(user, login=True)
+                session.pop('email', None)
+                session.pop('last_confirmation_email', None)
+                flash('Вы успешно вошли!', 'success')
+                next_page = request.args.get('next')
+                return redirect(next_page) if next_page else redirect(url_for('main.home'))
+            else:
+                flash('Пожалуйста, подтвердите вашу почту перед входом.', 'warning')
+                session['last_confirmation_email'] = datetime.now(timezone.utc).isoformat()
+                return redirect(url_for('user.confirm_email_info'))
+        else:
+            audit('login_failed', user, email=form.email.data)
+            flash('Неверный email или пароль', 'danger')
+
+    if is_password_requested:
+        session.pop("is_password_reset_requested", None)
+
+    return render_template('login.html', form=form, is_password_requested=is_password_requested)
+
+
+@user_bp.route('logout')
+@login_required
+async def logout():
+    """Разлогинивает пользователя и очищает сессию"""
+    logout_user()
+    flash('Вы вышли из системы', 'info')
+    return redirect(url_for('main.home'))
+
+
+@user_bp.route('reset_password', methods=['GET', 'POST'])
+async def reset_request():
+    """Отправляет пользователю письмо с токеном для сброса пароля"""
+    form = RequestResetForm()
+
+    if form.validate_on_submit():
+        email = form.email.data
+        session['email'] = email
+        last_sent = session.get('last_reset_request')
+        current_time = datetime.now(timezone.utc)
+
+        if last_sent and (current_time - datetime.fromisoformat(last_sent)) < timedelta(seconds=60):
+            flash("Подождите немного перед повторной отправкой письма", "warning")
+            return redirect(url_for('user.reset_request'))
+
+        try:
+            # Одновременные повторы с тем же адресом ждут результат первого запроса
+            sent = await single_flight_async('reset', email, lambda: send_reset_to(email))
+        except SQLAlchemyError:
+            flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.")
+            return redirect(url_for("user.login"))
+
+        if sent is not None:
+            session["last_reset_request"] = datetime.now(timezone.utc).isoformat()
+            if sent:
+                flash('Письмо с инструкциями по сбросу пароля отправлено на вашу почту.', 'info')
+            else:
+                flash(MAIL_DELAYED_MESSAGE, 'warning')
+            session['is_password_reset_requested'] = True
+            return redirect(url_for('user.login'))
+        else:
+            flash('Пользователь с таким email не найден.', 'warning')
+
+    return render_template('reset_request.html', form=form, email_value=session.get('email', ''))
+
+
+@user_bp.route('reset_password/<token>', methods=['GET', 'POST'])
+async def reset_token(token):
+    """Обрабатывает сброс пароля пользователя по предоставленному токену"""
+
+    try:
+        token_data = User.load_token(token, RESET_TOKEN_SALT)
+    except SQLAlchemyError:
+        flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
+        return redirect(url_for('user.login'))
+    if token_data is None:
+        flash('Ссылка для сброса пароля недействительна или устарела.', 'warning')
+        return redirect(url_for('user.reset_request'))
+
+    async with get_async_session() as db_session:
+        try:
+            user = await db_session.get(User, token_data['user_id'])
+        except SQLAlchemyError:
+            flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
+            return redirect(url_for('user.login'))
+
+        if user is None:
+            flash('Ссылка для сброса пароля недействительна или устарела.', 'warning')
+            return redirect(url_for('user.reset_request'))
+
+        form = ResetPasswordForm()
+        if form.validate_on_submit():
+            await asyncio.to_thread(user.set_password, form.password.data)
+            consume_token(token_data, db_session)
+            try:
+                await db_session.commit()
+            except IntegrityError:
+                await db_session.rollback()
+                flash('Ссылка для сброса пароля недействительна или устарела.', 'warning')
+                return redirect(url_for('user.reset_request'))
+            except SQLAlchemyError:
+                await db_session.rollback()
+                flash("Не удалось обновить пароль. Попробуйте позже.", 'danger')
+                return redirect(url_for('user.reset_request'))
+            audit('password_reset', user)
+            flash('Ваш пароль был успешно обновлён. Теперь вы можете войти.', 'success')
+            session.pop('email', None)
+            session.pop('last_reset_request', None)
+            return redirect(url_for('user.login'))
+
+    return render_template('reset_token.html', form=form)
+
+
+@user_bp.route('/confirm_email', methods=['GET', 'POST'])
+async def confirm_email_info():
+    """Отправляет повторное сообщение на почту пользователя с ее подтверждением"""
+    form = RepeatEmailConfirmationForm()
+    if form.validate_on_submit():
+        email = session.get('email')
+        last_sent = session.get("last_confirmation_email")
+        current_time = datetime.now(timezone.utc)
+
+        if last_sent and (current_time - datetime.fromisoformat(last_sent)) < timedelta(seconds=60):
+            flash("Подождите немного перед повторной отправкой письма", "warning")
+            return redirect(url_for('user.confirm_email_info'))
+
+        try:
+            sent = await single_flight_async('confirm', email, lambda: send_confirmation_to(email))
+        except SQLAlchemyError:
+            flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
+            return redirect(url_for("user.confirm_email_info"))
+
+        if sent is not None:
+            if sent:
+                flash("Повторное письмо было отправлено вам на почту", "success")
+            else:
+                flash(MAIL_DELAYED_MESSAGE, "warning")
+            session['last_confirmation_email'] = current_time.isoformat()
+        else:
+            flash("Пользователь не найден", "danger")
+
+        return redirect(url_for('user.confirm_email_info'))
+    return render_template('confirm_email.html', form=form)
+
+
+@user_bp.route('/confirm_email/<token>', methods=['GET', 'POST'])
+async def confirm_email_token(token):
+    """Подтверждает подлинность почты пользователя"""
+    try:
+        token_data = User.load_token(token, CONFIRM_TOKEN_SALT)
+    except SQLAlchemyError:
+        flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
+        return redirect(url_for('user.register'))
+
+    async with get_async_session() as db_session:
+        try:
+            user = await db_session.get(User, token_data['user_id']) if token_data else None
+        except SQLAlchemyError:
+            flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
+            return redirect(url_for('user.register'))
+
+        if user is None:
+            flash("Почтовый ящик не найден", 'danger')
+            return redirect(url_for('user.register'))
+
+        if user.is_confirmed:
+            flash("Почта уже подтверждена", 'info')
+        else:
+            user.is_confirmed = True
+        consume_token(token_data, db_session)
+
+        try:
+            await db_session.commit()
+            audit('email_confirmed', user)
+            flash("Вы успешно зарегестрированы", 'success')
+        except IntegrityError:
+            await db_session.rollback()
+            flash("Почтовый ящик не найден", 'danger')
+            return redirect(url_for('user.register'))
+        except SQLAlchemyError:
+            await db_session.rollback()
+            flash("Ошибка при подтверждении email. Попробуйте позже.", 'danger')
+            return redirect(url_for('user.register'))
+
+    return redirect(url_for('main.home'))
@@ -0,0 +1,146 @@
+import json
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import click
+from flask import Flask, current_app, has_request_context, request
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+
+from app import db
+from .background import BackgroundFlusher
+from .models import AuditEvent
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+class AuditLog(BackgroundFlusher):
+    """Буфер событий аудита. События копятся в памяти и пишутся в БД пачками одним INSERT
+    каждые AUDIT_FLUSH_INTERVAL_MS или по достижении AUDIT_BATCH_SIZE событий"""
+
+    def __init__(self, app: Flask) -> None:
+        super().__init__(app, app.config['AUDIT_FLUSH_INTERVAL_MS'] / 1000, 'audit-log')
+        self.batch_size = app.config['AUDIT_BATCH_SIZE']
+        self.capacity = app.config['AUDIT_BUFFER_SIZE']
+        self.overflow_policy = app.config['AUDIT_OVERFLOW_POLICY']
+        self.block_timeout = app.config['AUDIT_BLOCK_TIMEOUT_MS'] / 1000
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"AUDIT_OVERFLOW_POLICY должна быть одной из {OVERFLOW_POLICIES}")
+
+        self._buffer: deque[dict] = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self.dropped = 0
+        self.written = 0
+
+    def record(self, event: str, user_id: int | None = None, email: str | None = None,
+               ip: str | None = None) -> None:
+        """Кладет событие в буфер, не обращаясь к БД"""
+
+        row = {'created_at': datetime.now(timezone.utc), 'event': event,
+               'user_id': user_id, 'email': email, 'ip': ip}
+        with self._lock:
+            if len(self._buffer) >= self.capacity and not self._make_room():
+                self.dropped += 1
+                return
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        self.wake(now=full)
+
+    def _make_room(self) -> bool:
+        """Освобождает место в полном буфере согласно политике; вызывается под блокировкой"""
+
+        if self.overflow_policy == 'drop_oldest':
+            self._buffer.popleft()
+            self.dropped += 1
+            return True
+        if self.overflow_policy == 'block' and self.enabled:
+            self._wakeup.set()
+            return self._not_full.wait_for(lambda: len(self._buffer) < self.capacity, self.block_timeout)
+        return False
+
+    def has_pending(self) -> bool:
+        return bool(self._buffer)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def flush(self) -> None:
+        with self._lock:
+            rows = list(self._buffer)
+            self._buffer.clear()
+            self._not_full.notify_all()
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(AuditEvent.__table__), batch)
+            except Exception:
+                self._requeue(rows[start:])
+                raise
+            self.written += len(batch)
+
+    def _requeue(self, rows: list[dict]) -> None:
+        """Возвращает незаписанные события в начало буфера; не поместившиеся
+        в capacity самые старые события считаются потерянными"""
+
+        with self._lock:
+            self._buffer.extendleft(reversed(rows))
+            while len(self._buffer) > self.capacity:
+                self._buffer.popleft()
+                self.dropped += 1
+
+
+def init_audit(app: Flask) -> None:
+    app.extensions['audit'] = AuditLog(app)
+    app.cli.add_command(audit_cli)
+
+
+def audit(event: str, user=None, email: str | None = None) -> None:
+    """Записывает событие аудита для текущего запроса"""
+
+    ip = request.remote_addr if has_request_context() else None
+    current_app.extensions['audit'].record(
+        event,
+        user_id=user.id if user is not None else None,
+        email=email or (user.email if user is not None else None),
+        ip=ip,
+    )
+
+
+audit_cli = AppGroup('audit', help='Журнал событий аутентификации')
+
+
+@audit_cli.command('query')
+@click.option('--event', help='Тип события, например login_failed')
+@click.option('--email', help='Email пользователя')
+@click.option('--user-id', type=int, help='ID пользователя')
+@click.option('--since', type=click.DateTime(), help='Не раньше этого времени (UTC)')
+@click.option('--until', type=click.DateTime(), help='Раньше этого времени (UTC)')
+@click.option('--limit', type=int, default=50, show_default=True)
+@click.option('--json', 'as_json', is_flag=True, help='Вывод в JSON Lines')
+def query_command(event, email, user_id, since, until, limit, as_json):
+    """Выводит последние события аудита с фильтрами"""
+
+    stmt = select(AuditEvent).order_by(AuditEvent.id.desc()).limit(limit)
+    if event:
+        stmt = stmt.where(AuditEvent.event == event)
+    if email:
+        stmt = stmt.where(AuditEvent.email == email)
+    if user_id is not None:
+        stmt = stmt.where(AuditEvent.user_id == user_id)
+    if since:
+        stmt = stmt.where(AuditEvent.created_at >= since)
+    if until:
+        stmt = stmt.where(AuditEvent.created_at < until)
+
+    for row in db.session.execute(stmt).scalars():
+        if as_json:
+            click.echo(json.dumps({
+                'id': row.id, 'created_at': row.created_at.isoformat(), 'event': row.event,
+                'user_id': row.user_id, 'email': row.email, 'ip': row.ip,
+            }, ensure_ascii=False))
+        else:
+            click.echo(f"{row.created_at:%Y-%m-%d %H:%M:%S}  {row.event:<16} "
+                       f"{row.user_id or '-':<6} {row.email or '-':<40} {row.ip or '-'}")
@@ -0,0 +1,86 @@
+import abc
+import atexit
+import logging
+import threading
+
+from flask import Flask
+
+
+class BackgroundFlusher(abc.ABC):
+    """Фоновый поток, который периодически сбрасывает накопленные в памяти данные в БД.
+
+    Наследники реализуют flush() и has_pending(). Поток стартует лениво при первом wake(), поэтому
+    импорт и create_app его не запускают. При остановке процесса выполняется
+    последний сброс. Если BACKGROUND_FLUSH выключен (по умолчанию в TESTING),
+    поток не создается и сброс вызывается явно.
+    """
+
+    def __init__(self, app: Flask, interval: float, name: str) -> None:
+        self.app = app
+        self.interval = interval
+        self.name = name
+        enabled = app.config.get('BACKGROUND_FLUSH')
+        self.enabled = not app.testing if enabled is None else enabled
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    @abc.abstractmethod
+    def flush(self) -> None:
+        """Записывает накопленные данные; вызывается в контексте приложения"""
+
+    @abc.abstractmethod
+    def has_pending(self) -> bool:
+        """Есть ли что сбрасывать"""
+
+    def wake(self, now: bool = False) -> None:
+        """Запускает поток при необходимости; now=True — сбросить данные, не дожидаясь таймера"""
+
+        if not self.enabled:
+            if now:
+                self.flush_safely()
+            return
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None and not self._stopped.is_set():
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+        if now:
+            self._wakeup.set()
+
+    def flush_safely(self) -> None:
+        """Сбрасывает данные в контексте приложения, ошибки только логируются"""
+
+        if not self.has_pending():
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            logging.exception(f"Ошибка фонового сброса {self.name}")
+
+    def stop(self, timeout: float = 5) -> None:
+        """Останавливает поток и сбрасывает остаток данных"""
+
+        atexit.unregister(self.stop)
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.flush_safely()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush_safely()
+
+
+def stop_background(app: Flask) -> None:
+    """Останавливает все фоновые сбросы приложения с финальной записью буферов"""
+
+    for extension in list(app.extensions.values()):
+        if isinstance(extension, BackgroundFlusher):
+            extension.stop()
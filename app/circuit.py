@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Автомат защиты для внешней зависимости.
+
+    closed: вызовы разрешены, подряд идущие ошибки считаются. После failure_threshold ошибок
+    переходит в open: вызовы сразу отклоняются на reset_timeout секунд. Затем half_open:
+    пропускается не более half_open_probes пробных вызовов; успех закрывает автомат,
+    ошибка снова открывает его.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_probes: int = 1) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+        self.failures_total = 0
+        self.successes_total = 0
+        self.rejected_total = 0
+        self.opened_total = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self) -> bool:
+        """Можно ли сейчас выполнить вызов; при отказе вызов нужно пропустить"""
+
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected_total += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes_total += 1
+            self._consecutive_failures = 0
+            if self._state != CLOSED:
+                logging.info(f"Автомат {self.name} закрыт")
+            self._state = CLOSED
+            self._probes_in_flight = 0
+
+    def record_neutral(self) -> None:
+        """Вызов завершился ошибкой, не говорящей о состоянии зависимости: освобождает
+        слот пробного вызова, не меняя состояние автомата"""
+
+        with self._lock:
+            if self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures_total += 1
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened_total += 1
+                    logging.warning(f"Автомат {self.name} открыт на {self.reset_timeout} с")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes_in_flight = 0
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+
+    def metrics(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            retry_in = self.reset_timeout - (time.monotonic() - self._opened_at) if self._state == OPEN else 0
+            return {
+                'state': self._state,
+                'consecutive_failures': self._consecutive_failures,
+                'failures_total': self.failures_total,
+                'successes_total': self.successes_total,
+                'rejected_total': self.rejected_total,
+                'opened_total': self.opened_total,
+                'retry_in_seconds': round(max(retry_in, 0), 3),
+            }
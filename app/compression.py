@@ -0,0 +1,172 @@
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from itertools import chain
+
+from flask import Flask, current_app, g, request
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+# Сжимаются только текстовые форматы: картинки и архивы уже сжаты
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+ENCODINGS = ('gzip', 'deflate')
+# Отметка в environ: ответ не сжимать
+SKIP_COMPRESSION_KEY = 'app.compression.skip'
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Выбирает кодировку по Accept-Encoding с учетом q-значений; при равенстве — gzip"""
+
+    accepted = parse_accept_header(accept_encoding)
+    best = max(ENCODINGS, key=lambda encoding: accepted[encoding])
+    return best if accepted[best] > 0 else None
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=level, mtime=0)  # mtime=0: одинаковый результат для кэша
+    return zlib.compress(body, level)  # deflate в HTTP — это формат zlib
+
+
+class CompressionMiddleware:
+    """WSGI-слой сжатия ответов.
+
+    Сжимаются ответы 200 с текстовым Content-Type и известным Content-Length не меньше
+    min_size. Потоковые ответы (без Content-Length, например выгрузка CSV) проходят
+    как есть, чтобы не собирать их целиком в памяти. Страницы с CSRF-токеном и ответы,
+    отмеченные skip_compression(), не сжимаются. Сжатые статические файлы хранятся
+    в LRU-кэше по пути, ETag и кодировке.
+    """
+
+    def __init__(self, wsgi_app, min_size: int = 500, level: int = 6,
+                 static_prefix: str = '/static/', cache_size: int = 256) -> None:
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.level = level
+        self.static_prefix = static_prefix
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, environ, start_response):
+        started = {}
+        written: list[bytes] = []
+
+        def capture(status, headers, exc_info=None):
+            started.update(status=status, headers=headers, exc_info=exc_info)
+            return written.append
+
+        app_iter = self.wsgi_app(environ, capture)
+        status, headers = started['status'], Headers(started['headers'])
+
+        if not self._eligible(environ, status, headers):
+            start_response(status, headers.to_wsgi_list(), started['exc_info'])
+            return ClosingIterator(chain(written, app_iter), getattr(app_iter, 'close', None))
+
+        vary = headers.get('Vary')
+        headers['Vary'] = f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            start_response(status, headers.to_wsgi_list(), started['exc_info'])
+            return ClosingIterator(chain(written, app_iter), getattr(app_iter, 'close', None))
+
+        try:
+            body = b''.join(chain(written, app_iter))
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        compressed = self._compressed(environ, headers, body, encoding)
+
+        self.bytes_in += len(body)
+        if len(compressed) >= len(body):
+            self.bytes_out += len(body)
+            start_response(status, headers.to_wsgi_list(), started['exc_info'])
+            return [body]
+
+        self.bytes_out += len(compressed)
+        headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(compressed))
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # Байты другие, поэтому ETag слабый; If-None-Match сравнивается слабо и 304 сохраняется
+            headers['ETag'] = f'W/{etag}'
+        start_response(status, headers.to_wsgi_list(), started['exc_info'])
+        return [compressed]
+
+    def _eligible(self, environ, status: str, headers: Headers) -> bool:
+        if environ['REQUEST_METHOD'] == 'HEAD' or not status.startswith('200'):
+            return False
+        if environ.get(SKIP_COMPRESSION_KEY):
+            return False
+        if 'Content-Encoding' in headers or 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        if not headers.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        length = headers.get('Content-Length')
+        return length is not None and length.isdigit() and int(length) >= self.min_size
+
+    def _compressed(self, environ, headers: Headers, body: bytes, encoding: str) -> bytes:
+        path = environ.get('PATH_INFO', '')
+        etag = headers.get('ETag')
+        if not (path.startswith(self.static_prefix) and etag):
+            return compress(body, encoding, self.level)
+
+        key = (path, etag, encoding)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+        compressed = compress(body, encoding, self.level)
+        with self._lock:
+            self.cache_misses += 1
+            self._cache[key] = compressed
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def metrics(self) -> dict:
+        return {
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': self.bytes_in / self.bytes_out if self.bytes_out else None,
+            'cache_entries': len(self._cache),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def skip_compression() -> None:
+    """Отключает сжатие ответа на текущий запрос"""
+
+    request.environ[SKIP_COMPRESSION_KEY] = True
+
+
+def _skip_pages_with_csrf_token(response):
+    # BREACH: страница с CSRF-токеном рядом с данными пользователя (например, email в форме
+    # сброса пароля) позволяет подбирать токен по размеру сжатого ответа
+    if current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in g:
+        skip_compression()
+    return response
+
+
+def init_compression(app: Flask) -> None:
+    if app.config['COMPRESSION_ENABLED']:
+        app.after_request(_skip_pages_with_csrf_token)
+        middleware = CompressionMiddleware(
+            app.wsgi_app,
+            min_size=app.config['COMPRESSION_MIN_SIZE'],
+            level=app.config['COMPRESSION_LEVEL'],
+            static_prefix=f"{app.static_url_path}/",
+            cache_size=app.config['COMPRESSION_CACHE_SIZE'],
+        )
+        app.wsgi_app = middleware
+        app.extensions['compression'] = middleware
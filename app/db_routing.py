@@ -0,0 +1,114 @@
+import itertools
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import Flask, current_app, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import OperationalError
+
+# Ключ в cookie-сессии: до этого момента чтения клиента идут на основную БД
+READ_PRIMARY_UNTIL_KEY = '_read_primary_until'
+
+
+class ReplicaRouter:
+    """Выбирает реплику для чтения по кругу и временно исключает недоступные"""
+
+    def __init__(self, engines: dict[str, sa.engine.Engine], retry_after: float) -> None:
+        self.engines = engines
+        self.bind_keys = list(engines)
+        self.retry_after = retry_after
+        self._cycle = itertools.cycle(self.bind_keys)
+        self._down_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def choose(self) -> str | None:
+        """Возвращает ключ следующей живой реплики или None, если живых нет"""
+
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.bind_keys)):
+                key = next(self._cycle)
+                if self._down_until.get(key, 0) <= now:
+                    return key
+        return None
+
+    def mark_down(self, bind_key: str) -> None:
+        with self._lock:
+            self._down_until[bind_key] = time.monotonic() + self.retry_after
+
+
+def init_db_routing(app: Flask) -> None:
+    """Создает движки реплик и маршрутизатор, если в конфиге заданы SQLALCHEMY_READ_REPLICAS"""
+
+    # Реплики не добавляются в SQLALCHEMY_BINDS: create_all и миграции не должны их трогать
+    replicas = app.config.get('SQLALCHEMY_READ_REPLICAS') or {}
+    if replicas:
+        engines = {name: sa.create_engine(uri) for name, uri in replicas.items()}
+        app.extensions['db_routing'] = ReplicaRouter(engines, app.config['SQLALCHEMY_REPLICA_RETRY_SECONDS'])
+
+
+def stick_to_primary() -> None:
+    """Направляет чтения текущего клиента на основную БД на время READ_YOUR_WRITES_SECONDS"""
+
+    if has_request_context():
+        session[READ_PRIMARY_UNTIL_KEY] = time.time() + current_app.config['READ_YOUR_WRITES_SECONDS']
+
+
+def _is_plain_read(clause) -> bool:
+    return isinstance(clause, sa.Select) and clause._for_update_arg is None
+
+
+def _client_needs_primary() -> bool:
+    return has_request_context() and session.get(READ_PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+class RoutingSession(Session):
+    """Сессия, которая отправляет чтения на реплики, а записи и все, что внутри транзакции
+    с записью, — на основную БД"""
+
+    def __init__(self, db, **kwargs) -> None:
+        super().__init__(db, **kwargs)
+        self._wrote = False  # В текущей транзакции уже были записи
+        self._replica_key: str | None = None  # Реплика, выбранная для последнего чтения
+        sa.event.listen(self, 'after_flush', self._on_flush)
+        sa.event.listen(self, 'after_commit', self._on_commit)
+        sa.event.listen(self, 'after_rollback', self._on_rollback)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        self._replica_key = None
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        router = current_app.extensions.get('db_routing')
+
+        if (router is None or bind is not None or primary is not self._db.engines[None]
+                or self._wrote or self._flushing or self.new or self.dirty or self.deleted
+                or not _is_plain_read(clause) or _client_needs_primary()):
+            return primary
+
+        key = router.choose()
+        if key is None:
+            return primary
+        self._replica_key = key
+        return router.engines[key]
+
+    def execute(self, statement, *args, **kwargs):
+        try:
+            return super().execute(statement, *args, **kwargs)
+        except OperationalError:
+            key = self._replica_key
+            if key is None:
+                raise
+            # Реплика недоступна: исключаем ее на время и повторяем чтение (на другой реплике или основной БД)
+            current_app.extensions['db_routing'].mark_down(key)
+            return super().execute(statement, *args, **kwargs)
+
+    def _on_flush(self, _session, _flush_context) -> None:
+        self._wrote = True
+
+    def _on_commit(self, _session) -> None:
+        if self._wrote:
+            stick_to_primary()
+        self._wrote = False
+
+    def _on_rollback(self, _session) -> None:
+        self._wrote = False
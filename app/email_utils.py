@@ -3,8 +3,41 @@ from flask import url_for, current_app
 from app import mail
 import logging
 
+# Показывается пользователю, когда письмо ушло в очередь повторной отправки
+MAIL_DELAYED_MESSAGE = 'Почтовый сервер временно недоступен, мы отправим письмо повторно в ближайшее время.'
 
-def send_reset_password_email(user: 'User') -> None:
+
+def deliver(msg: Message, user: 'User') -> bool:
+    """Отправляет письмо через автомат SMTP. Возвращает False, если сервер недоступен
+    и письмо поставлено в очередь на повторную отправку"""
+    breaker = current_app.extensions['mail_breaker']
+    outbox = current_app.extensions['mail_outbox']
+
+    # Пока автомат открыт, не ждем таймаута недоступного сервера
+    if not breaker.allow():
+        logging.warning(f"SMTP недоступен, письмо пользователю {user.email} отложено")
+        outbox.put(msg)
+        return False
+
+    try:
+        mail.send(msg)
+    except OSError as e:
+        # Сетевые ошибки и ответы SMTP (SMTPException наследует OSError) — сервер недоступен
+        breaker.record_failure()
+        logging.error(f"Ошибка при отправке письма пользователю {user.email}: {e}")
+        outbox.put(msg)
+        return False
+    except Exception as e:
+        # Ошибка в самом письме: повтор не поможет, автомат только освобождает пробный слот
+        breaker.record_neutral()
+        logging.error(f"Ошибка при отправке письма пользователю {user.email}: {e}")
+        return True
+
+    breaker.record_success()
+    return True
+
+
+def send_reset_password_email(user: 'User') -> bool:
     """Создает письмо с токеном пользователю"""
     token = user.get_reset_token()
     msg = Message('Сброс пароля',
@@ -27,13 +60,10 @@ def send_reset_password_email(user: 'User') -> None:
         "<p>С уважением,<br>Команда сайта</p>"
     )
 
-    try:
-        mail.send(msg)
-    except Exception as e:
-        logging.error(f"Ошибка при отправке письма подтверждения почты пользователю {user.email}: {e}")
+    return deliver(msg, user)
 
 
-def send_email_confirm_token(user: 'User') -> None:
+def send_email_confirm_token(user: 'User') -> bool:
     token = user.get_email_confirm_token()
     msg = Message('Подтверждение электронной почты',
                   sender=current_app.config['MAIL_USERNAME'],
@@ -56,9 +86,6 @@ def send_email_confirm_token(user: 'User') -> None:
         "<p>С уважением,<br>Команда сайта</p>"
     )
 
-    try:
-        mail.send(msg)
-    except Exception as e:
-        logging.error(f"Ошибка при отправке письма подтверждения почты пользователю {user.email}: {e}")
+    return deliver(msg, user)
 
 
@@ -1,9 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_mail import Mail
 from flask_migrate import Migrate
+from .db_routing import RoutingSession
+from .mailer import TimeoutMail
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Чтения могут уходить на реплики
 login_manager = LoginManager()
-mail = Mail()
+mail = TimeoutMail()  # SMTP с таймаутами на подключение и отправку
 migrate = Migrate()
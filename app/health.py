@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from flask import Flask, current_app
+
+from .extensions import db
+
+OK = 'ok'
+DEGRADED = 'degraded'
+FAIL = 'fail'
+
+
+def pool_stats(pool: sa.pool.Pool) -> dict:
+    """Счетчики пула соединений; у пулов SQLite часть из них отсутствует"""
+
+    stats = {'pool': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+def ping(engine: sa.engine.Engine) -> None:
+    with engine.connect() as conn:
+        conn.execute(sa.text('SELECT 1'))
+
+
+def named_engines() -> dict[str, tuple[sa.engine.Engine, bool]]:
+    """Все движки приложения по именам; второй элемент — нужна ли база для готовности"""
+
+    engines = {'primary' if key is None else f'bind:{key}': (engine, True)
+               for key, engine in db.engines.items()}
+    router = current_app.extensions.get('db_routing')
+    if router is not None:
+        # Без реплик чтения уходят на основную БД, поэтому они не обязательны
+        engines.update({f'replica:{key}': (engine, False) for key, engine in router.engines.items()})
+    shards = current_app.extensions.get('user_shards')
+    if shards is not None:
+        engines.update({f'shard:{key}': (engine, True) for key, engine in shards.engines.items()})
+    return engines
+
+
+class ReadinessProbe:
+    """Проверка готовности для балансировщика.
+
+    Пингует все базы параллельно с таймаутом READINESS_DB_TIMEOUT_MS и собирает счетчики
+    пулов, очередей и кэшей. Результат кэшируется на READINESS_CACHE_MS: поток проб
+    не превращается в поток запросов к БД, а одновременные пробы ждут одну проверку.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.cache_ttl = app.config['READINESS_CACHE_MS'] / 1000
+        self.db_timeout = app.config['READINESS_DB_TIMEOUT_MS'] / 1000
+        self._executor: ThreadPoolExecutor | None = None
+        self._in_flight: dict[str, Future] = {}  # Зависший пинг не запускается повторно
+        self._lock = threading.Lock()
+        self._report: dict | None = None
+        self._checked_at = 0.0
+
+    def report(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            if self._report is None or now - self._checked_at >= self.cache_ttl:
+                self._report = self._check()
+                self._checked_at = now = time.monotonic()
+            return {**self._report, 'cache_age_ms': round((now - self._checked_at) * 1000)}
+
+    def _check(self) -> dict:
+        engines = named_engines()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix='readyz')
+
+        for name, (engine, _required) in engines.items():
+            if name not in self._in_flight or self._in_flight[name].done():
+                self._in_flight[name] = self._executor.submit(ping, engine)
+        wait([self._in_flight[name] for name in engines], timeout=self.db_timeout)
+
+        status = OK
+        databases = {}
+        for name, (engine, required) in engines.items():
+            future = self._in_flight[name]
+            if not future.done():
+                result = {'status': FAIL, 'error': 'timeout'}
+            elif future.exception() is not None:
+                result = {'status': FAIL, 'error': type(future.exception()).__name__}
+            else:
+                result = {'status': OK}
+            databases[name] = {**result, **pool_stats(engine.pool)}
+            if result['status'] == FAIL:
+                status = FAIL if required else max(status, DEGRADED, key=_severity)
+
+        breaker = current_app.extensions['mail_breaker'].metrics()
+        mail = {
+            'status': OK if breaker['state'] == 'closed' else DEGRADED,
+            'breaker': breaker,
+            'outbox_pending': current_app.extensions['mail_outbox'].pending(),
+            'outbox_dropped': current_app.extensions['mail_outbox'].dropped,
+        }
+        # Письма откладываются в очередь, поэтому почта не делает сервис неготовым
+        status = max(status, mail['status'], key=_severity)
+
+        return {
+            'status': status,
+            'checked_at': datetime.now(timezone.utc).isoformat(),
+            'databases': databases,
+            'mail': mail,
+            'queues': self._queues(),
+            'caches': self._caches(),
+        }
+
+    @staticmethod
+    def _queues() -> dict:
+        audit_log = current_app.extensions['audit']
+        return {
+            'audit': {'pending': audit_log.pending(), 'written': audit_log.written,
+                      'dropped': audit_log.dropped},
+            'activity': current_app.extensions['activity'].metrics(),
+        }
+
+    @staticmethod
+    def _caches() -> dict:
+        caches = {
+            'revoked_tokens': len(current_app.extensions['token_revocations']),
+            'single_flight': current_app.extensions['single_flight'].metrics(),
+        }
+        compression = current_app.extensions.get('compression')
+        if compression is not None:
+            caches['compression'] = compression.metrics()
+        return caches
+
+
+def _severity(status: str) -> int:
+    return (OK, DEGRADED, FAIL).index(status)
+
+
+def init_health(app: Flask) -> None:
+    app.extensions['readiness'] = ReadinessProbe(app)
@@ -0,0 +1,105 @@
+import logging
+import smtplib
+import threading
+from collections import deque
+
+from flask import Flask, current_app
+from flask_mail import Connection, Mail, Message
+
+from .background import BackgroundFlusher
+from .circuit import CircuitBreaker
+
+
+class TimeoutConnection(Connection):
+    """SMTP-соединение с таймаутами: MAIL_CONNECT_TIMEOUT на подключение,
+    MAIL_SEND_TIMEOUT на каждую последующую операцию с сокетом"""
+
+    def configure_host(self) -> smtplib.SMTP | smtplib.SMTP_SSL:
+        config = current_app.config
+        smtp_class = smtplib.SMTP_SSL if self.mail.use_ssl else smtplib.SMTP
+        host = smtp_class(self.mail.server, self.mail.port, timeout=config['MAIL_CONNECT_TIMEOUT'])
+        host.sock.settimeout(config['MAIL_SEND_TIMEOUT'])
+
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+
+class TimeoutMail(Mail):
+    """Flask-Mail, у которого соединение не может зависнуть на недоступном сервере"""
+
+    def connect(self) -> Connection:
+        app = getattr(self, 'app', None) or current_app
+        return TimeoutConnection(app.extensions['mail'])
+
+
+class MailOutbox(BackgroundFlusher):
+    """Письма, которые не удалось отправить сразу. Фоновый поток повторяет отправку,
+    когда автомат SMTP пропускает вызовы"""
+
+    def __init__(self, app: Flask, breaker: CircuitBreaker) -> None:
+        super().__init__(app, app.config['MAIL_RETRY_INTERVAL_SECONDS'], 'mail-outbox')
+        self.breaker = breaker
+        self.capacity = app.config['MAIL_OUTBOX_SIZE']
+        self._messages: deque[Message] = deque()
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, message: Message) -> None:
+        """Кладет письмо в очередь; в полной очереди вытесняется самое старое"""
+
+        with self._lock:
+            if len(self._messages) >= self.capacity:
+                self._drop(self._messages.popleft(), 'очередь переполнена')
+            self._messages.append(message)
+        self.wake()
+
+    def _drop(self, message: Message, reason: str) -> None:
+        self.dropped += 1
+        logging.error(f"Письмо {message.subject!r} для {message.recipients} отброшено: {reason}")
+
+    def has_pending(self) -> bool:
+        return bool(self._messages)
+
+    def pending(self) -> int:
+        return len(self._messages)
+
+    def flush(self) -> None:
+        from .extensions import mail
+
+        while self._messages and self.breaker.allow():
+            with self._lock:
+                message = self._messages.popleft()
+            try:
+                mail.send(message)
+            except OSError:
+                # Сервер снова недоступен: письмо возвращается в начало очереди
+                self.breaker.record_failure()
+                with self._lock:
+                    if len(self._messages) >= self.capacity:
+                        # Пока шла отправка, очередь заполнили новые письма; это письмо самое старое
+                        self._drop(message, 'очередь переполнена')
+                    else:
+                        self._messages.appendleft(message)
+                return
+            except Exception:
+                # Ошибка в самом письме: повтор не поможет, письмо отбрасывается
+                self.breaker.record_neutral()
+                self.dropped += 1
+                logging.exception(f"Письмо {message.subject!r} для {message.recipients} отброшено")
+                continue
+            self.breaker.record_success()
+
+
+def init_mail_resilience(app: Flask) -> None:
+    breaker = CircuitBreaker(
+        'smtp',
+        failure_threshold=app.config['MAIL_BREAKER_FAILURE_THRESHOLD'],
+        reset_timeout=app.config['MAIL_BREAKER_RESET_SECONDS'],
+        half_open_probes=app.config['MAIL_BREAKER_HALF_OPEN_PROBES'],
+    )
+    app.extensions['mail_breaker'] = breaker
+    app.extensions['mail_outbox'] = MailOutbox(app, breaker)
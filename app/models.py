@@ -4,19 +4,58 @@ from flask import current_app
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from itsdangerous import BadSignature, SignatureExpired
 from app import db
+from .permissions import Permission, role_mask
 from typing import Optional
+from functools import lru_cache
+import secrets
+from sqlalchemy import DDL, event
 from datetime import datetime, timezone
 
+RESET_TOKEN_SALT = 'reset-password'
+CONFIRM_TOKEN_SALT = 'confirm-email'
+
+
+@lru_cache(maxsize=16)
+def _serializer(secret_key: str, salt: str) -> Serializer:
+    return Serializer(secret_key, salt=salt)
+
+
+def token_serializer(salt: str) -> Serializer:
+    """Подписчик токенов для соли; один объект на ключ и соль на весь процесс"""
+    return _serializer(current_app.config['SECRET_KEY'], salt)
+
 
 class User(UserMixin, db.Model):
     """Модель пользователя для базы данных"""
 
+    # Составные индексы для фильтров админского списка с keyset-пагинацией по id
+    __table_args__ = (
+        db.Index('ix_user_role_id', 'role', 'id'),
+        db.Index('ix_user_is_confirmed_id', 'is_confirmed', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
     is_confirmed = db.Column(db.Boolean, nullable=False, default=False)
     role = db.Column(db.String(20), nullable=False, default='user')
+    # Обновляются пачками через app.activity, в БД могут отставать на ACTIVITY_DEBOUNCE_SECONDS
+    last_login_at = db.Column(db.DateTime)
+    last_seen_at = db.Column(db.DateTime)
+
+    @property
+    def permissions(self) -> int:
+        """Битовая маска прав пользователя. Считается один раз на объект, без запросов к БД"""
+
+        role, mask = getattr(self, '_permission_cache', (None, 0))
+        if role != self.role:  # Пересчет только при смене роли
+            mask = role_mask(self.role)
+            self._permission_cache = (self.role, mask)
+        return mask
+
+    def has_permission(self, permission: Permission) -> bool:
+        return self.permissions & permission == permission
 
     def set_password(self, password: str) -> None:
         """Хэширует пароль и сохраняет его"""
@@ -29,41 +68,86 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def get_reset_token(self) -> str:
-        """Генерирует токен для сброса пароля"""
+        """Генерирует одноразовый токен для сброса пароля"""
 
-        s = Serializer(current_app.config['SECRET_KEY'])  # Создание объекта для подписи токена
-        return s.dumps({'user_id': self.id})  # Преобразование ID пользователя в токен
+        return self._make_token(RESET_TOKEN_SALT)
 
     @staticmethod  # Метод не требующий создания объекта
     def verify_reset_token(token: str, max_age=3600) -> Optional['User']:
         """Проверяет токен и возвращает User, если он валиден. Объявляет срок действия"""
 
-        s = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = s.loads(token, max_age=max_age)
-            user_id = data['user_id']  # Расшифровка и извлечение токена
-            return db.session.get(User, user_id)
-        except (BadSignature, SignatureExpired):
-            return None
+        from .sharding import user_session
+        data = User.load_token(token, RESET_TOKEN_SALT, max_age)  # Расшифровка и извлечение токена
+        return user_session().get(User, data['user_id']) if data else None
 
     def get_email_confirm_token(self) -> str:
-        """Генерирует токен для подтверждения почты"""
-        s = Serializer(current_app.config['SECRET_KEY'])
-        # Преобразование ID пользователя в токен
-        return s.dumps({'user_id': self.id, 'timestamp': datetime.now(timezone.utc).isoformat()})
+        """Генерирует одноразовый токен для подтверждения почты"""
+        return self._make_token(CONFIRM_TOKEN_SALT, timestamp=datetime.now(timezone.utc).isoformat())
 
     @staticmethod
     def verify_email_confirm_token(token: str, max_age=3600) -> Optional['User']:
         """Проверяет токен и возвращает User, если он валиден. Объявляет срок действия"""
-        s = Serializer(current_app.config['SECRET_KEY'])
+        from .sharding import user_session
+        data = User.load_token(token, CONFIRM_TOKEN_SALT, max_age)
+        return user_session().get(User, data['user_id']) if data else None
+
+    def _make_token(self, salt: str, **extra) -> str:
+        # Соль своя для каждого назначения: токен сброса нельзя использовать для подтверждения почты
+        s = token_serializer(salt)  # Объект для подписи токена
+        # Преобразование ID пользователя в токен; jti — идентификатор для отзыва
+        return s.dumps({'user_id': self.id, 'jti': secrets.token_hex(16), **extra})
+
+    @staticmethod
+    def load_token(token: str, salt: str, max_age=3600) -> Optional[dict]:
+        """Проверяет подпись, срок действия и отзыв токена без обращения к таблице пользователей.
+        Возвращает данные токена с добавленными issued_at и max_age или None"""
+        s = token_serializer(salt)
         try:
-            data = s.loads(token, max_age=max_age)
-            user_id = data['user_id']
-            return db.session.get(User, user_id)
+            data, issued_at = s.loads(token, max_age=max_age, return_timestamp=True)
         except (BadSignature, SignatureExpired):
             return None
+        # Использованные токены отсекаются по индексу в памяти до запроса пользователя
+        if current_app.extensions['token_revocations'].is_revoked(data.get('jti')):
+            return None
+        return {**data, 'issued_at': issued_at, 'max_age': max_age}
 
 
+class RevokedToken(db.Model):
+    """Использованный (отозванный) токен. Запись удаляется после истечения срока токена.
+    id растет в порядке фиксации записей и служит курсором дочитывания для других процессов"""
 
+    __table_args__ = {'sqlite_autoincrement': True}  # ID удаленных записей не переиспользуются
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(32), nullable=False, unique=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False)
 
 
+class AuditEvent(db.Model):
+    """Событие аутентификации в журнале аудита. Записи только добавляются"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    event = db.Column(db.String(32), nullable=False, index=True)
+    user_id = db.Column(db.Integer, index=True)
+    email = db.Column(db.String(120), index=True)
+    ip = db.Column(db.String(45))
+
+
+# В SQLite журнал защищен от изменения и удаления уже записанных событий
+for _operation in ('UPDATE', 'DELETE'):
+    event.listen(AuditEvent.__table__, 'after_create', DDL(
+        f"CREATE TRIGGER audit_event_append_only_{_operation.lower()} BEFORE {_operation} ON audit_event "
+        "BEGIN SELECT RAISE(ABORT, 'audit_event is append-only'); END"
+    ).execute_if(dialect='sqlite'))
+
+
+class UserDirectory(db.Model):
+    """Справочник пользователей при шардировании (app.sharding): выдает глобальные ID,
+    хранит уникальность имени и email и номер шарда, где лежит строка User"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(64), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)  # Нормализованный email
+    shard = db.Column(db.Integer, nullable=False, index=True)
@@ -0,0 +1,55 @@
+import functools
+import operator
+from enum import IntFlag
+
+from flask import Flask, abort, current_app
+from flask_login import current_user
+
+
+class Permission(IntFlag):
+    """Права доступа. Каждое право — отдельный бит, роль — их объединение"""
+
+    VIEW_PROFILE = 1
+    MANAGE_USERS = 2
+    ADMIN = 4
+
+
+def compile_role_masks(role_permissions: dict[str, list[str]]) -> dict[str, int]:
+    """Переводит описание ролей из конфига в словарь {роль: битовая маска}"""
+
+    masks = {}
+    for role, names in role_permissions.items():
+        try:
+            masks[role] = int(functools.reduce(operator.or_, (Permission[name] for name in names), Permission(0)))
+        except KeyError as e:
+            raise ValueError(f"Неизвестное право {e} у роли '{role}'") from None
+    return masks
+
+
+def init_permissions(app: Flask) -> None:
+    """Компилирует маски ролей один раз при запуске приложения"""
+
+    app.extensions['role_masks'] = compile_role_masks(app.config['ROLE_PERMISSIONS'])
+
+
+def role_mask(role: str) -> int:
+    """Возвращает маску роли; у неизвестной роли прав нет"""
+
+    return current_app.extensions['role_masks'].get(role, 0)
+
+
+def permission_required(*permissions: Permission):
+    """Декоратор маршрута: пускает только пользователей, у которых есть все указанные права"""
+
+    required = int(functools.reduce(operator.or_, permissions, Permission(0)))
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return current_app.login_manager.unauthorized()
+            if current_user.permissions & required != required:
+                abort(403)
+            return current_app.ensure_sync(view)(*args, **kwargs)
+        return wrapped
+    return decorator
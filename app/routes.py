@@ -1,13 +1,20 @@
 from flask import (Blueprint, request, redirect, url_for, flash,
-                   render_template, session)
+                   render_template, session, jsonify, current_app)
 from flask_login import login_user, logout_user, current_user, login_required
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import select
 
-from .models import User
-from app import db, login_manager
+from .models import User, RESET_TOKEN_SALT, CONFIRM_TOKEN_SALT
+from .permissions import Permission, permission_required
+from app import login_manager
 from .forms import RegistrationForm, LoginForm, RequestResetForm, ResetPasswordForm, RepeatEmailConfirmationForm
-from app.email_utils import send_reset_password_email, send_email_confirm_token
+from app.email_utils import send_reset_password_email, send_email_confirm_token, MAIL_DELAYED_MESSAGE
+from .audit import audit
+from .activity import track_activity
+from .tokens import consume_token
+from .sharding import (user_session, username_or_email_taken, save_new_user, commit_users,
+                       rollback_users)
+from .singleflight import single_flight
 from datetime import datetime, timezone, timedelta
 
 # Создание основного и пользовательского блупринтов маршрутов
@@ -19,7 +26,25 @@ user_bp = Blueprint('user', __name__, url_prefix="/user")
 
 def get_user_by_email(email: str) -> User | None:
     stmt = select(User).where(User.email == email)
-    return db.session.execute(stmt).scalars().first()
+    return user_session().execute(stmt).scalars().first()
+
+
+def send_reset_to(email: str) -> bool | None:
+    """Отправляет письмо сброса пароля; None — пользователь не найден"""
+    user = get_user_by_email(email)
+    if user is None:
+        return None
+    sent = send_reset_password_email(user)
+    audit('reset_requested', user)
+    return sent
+
+
+def send_confirmation_to(email: str) -> bool | None:
+    """Отправляет повторное письмо подтверждения; None — пользователь не найден"""
+    user = get_user_by_email(email)
+    if user is None:
+        return None
+    return send_email_confirm_token(user)
 
 
 @main_bp.route('/')
@@ -29,6 +54,21 @@ def home():
     return render_template('home.html')
 
 
+@main_bp.route('/healthz')
+def healthz():
+    """Проверка живости для балансировщика: процесс отвечает, БД не трогается"""
+
+    return jsonify(status='ok')
+
+
+@main_bp.route('/readyz')
+def readyz():
+    """Проверка готовности: БД, пулы соединений, почта и очереди; результат кэшируется"""
+
+    report = current_app.extensions['readiness'].report()
+    return jsonify(report), 503 if report['status'] == 'fail' else 200
+
+
 @user_bp.route('register', methods=['GET', 'POST'])
 def register():
     """Обрабатывает страницу регистрации пользователя"""
@@ -37,16 +77,7 @@ def register():
 
     # Проверка есть ли уже в БД данный пользователь
     if form.validate_on_submit():
-        stmt = select(User).where(
-            or_(
-                User.username == form.username.data,
-                User.email == form.email.data
-            )
-        )
-
-        existing_user = db.session.execute(stmt).scalars().first()
-
-        if existing_user:
+        if username_or_email_taken(form.username.data, form.email.data):
             flash('Пользователь с таким именем или email уже существует', 'danger')
             return redirect(url_for('user.register'))
 
@@ -59,14 +90,15 @@ def register():
         session['email'] = new_user.email
 
         try:
-            db.session.add(new_user)
-            db.session.commit()
-            flash('Регистрация прошла успешно! На вашу почту отправлено письмо для подтверждения.', 'success')
-            send_email_confirm_token(new_user)
+            save_new_user(new_user)  # При шардировании пишет в справочник и в шард пользователя
+            if send_email_confirm_token(new_user):
+                flash('Регистрация прошла успешно! На вашу почту отправлено письмо для подтверждения.', 'success')
+            else:
+                flash('Регистрация прошла успешно! ' + MAIL_DELAYED_MESSAGE, 'warning')
             # Храним время отправки письма в сессии для ограничения спама письмами
             session["last_confirmation_email"] = datetime.now(timezone.utc).isoformat()
         except SQLAlchemyError:
-            db.session.rollback()
+            rollback_users()
             flash('Ошибка при регистрации. Попробуйте позже.', 'danger')
             return redirect(url_for('user.register'))
 
@@ -78,7 +110,10 @@ def register():
 @login_manager.user_loader
 def load_user(user_id):
     """Загружает пользователя по ID для Flask-Login (поддержка сессий и авторизации)"""
-    return db.session.get(User, user_id)
+    user = user_session().get(User, int(user_id))
+    if user is not None:
+        track_activity(user)  # Только отметка в памяти, запись в БД идет пачками
+    return user
 
 
 @user_bp.route('login', methods=['GET', 'POST'])
@@ -107,6 +142,8 @@ def login():
         if user and user.check_password(password):
             if user.is_confirmed:
                 login_user(user, remember=form.remember.data)
+                audit('login', user)
+                track_activity(user, login=True)
                 session.pop('email', None)
                 session.pop('last_confirmation_email', None)
                 flash('Вы успешно вошли!', 'success')
@@ -118,6 +155,7 @@ def login():
                 session['last_confirmation_email'] = current_time.isoformat()
                 return redirect(url_for('user.confirm_email_info'))
         else:
+            audit('login_failed', user, email=form.email.data)
             flash('Неверный email или пароль', 'danger')
 
     if is_password_requested:
@@ -151,15 +189,18 @@ def reset_request():
             return redirect(url_for('user.reset_request'))
 
         try:
-            user = get_user_by_email(email)
+            # Одновременные повторы с тем же адресом ждут результат первого запроса
+            sent = single_flight('reset', email, lambda: send_reset_to(email))
         except SQLAlchemyError:
             flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.")
             return redirect(url_for("user.login"))
 
-        if user:
-            send_reset_password_email(user)
+        if sent is not None:
             session["last_reset_request"] = datetime.now(timezone.utc).isoformat()
-            flash('Письмо с инструкциями по сбросу пароля отправлено на вашу почту.', 'info')
+            if sent:
+                flash('Письмо с инструкциями по сбросу пароля отправлено на вашу почту.', 'info')
+            else:
+                flash(MAIL_DELAYED_MESSAGE, 'warning')
             session['is_password_reset_requested'] = True
             return redirect(url_for('user.login'))
         else:
@@ -173,7 +214,9 @@ def reset_token(token):
     """Обрабатывает сброс пароля пользователя по предоставленному токену"""
 
     try:
-        user = User.verify_reset_token(token)  # Попытка расшифровать токен и получить пользователя
+        # Подпись, срок и отзыв проверяются до обращения к таблице пользователей
+        token_data = User.load_token(token, RESET_TOKEN_SALT)
+        user = user_session().get(User, token_data['user_id']) if token_data else None
     except SQLAlchemyError:
         flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
         return redirect(url_for('user.login'))
@@ -185,14 +228,21 @@ def reset_token(token):
     form = ResetPasswordForm()
     if form.validate_on_submit():
         user.set_password(form.password.data)  # Установка нового хэшированного пароля
+        consume_token(token_data)  # Ссылка одноразовая: отзыв фиксируется вместе с паролем
         try:
-            db.session.commit()
+            commit_users()
+            audit('password_reset', user)
             flash('Ваш пароль был успешно обновлён. Теперь вы можете войти.', 'success')
             session.pop('email', None)
             session.pop('last_reset_request', None)
             return redirect(url_for('user.login'))
+        except IntegrityError:
+            # Тот же токен уже использован в другом процессе
+            rollback_users()
+            flash('Ссылка для сброса пароля недействительна или устарела.', 'warning')
+            return redirect(url_for('user.reset_request'))
         except SQLAlchemyError:
-            db.session.rollback()
+            rollback_users()
             flash("Не удалось обновить пароль. Попробуйте позже.", 'danger')
             return redirect(url_for('user.reset_request'))
 
@@ -213,15 +263,17 @@ def confirm_email_info():
             return redirect(url_for('user.confirm_email_info'))
 
         try:
-            user = get_user_by_email(email)
+            sent = single_flight('confirm', email, lambda: send_confirmation_to(email))
         except SQLAlchemyError:
             flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
             return redirect(url_for("user.confirm_email_info"))
 
-        if user:
-            send_email_confirm_token(user)
+        if sent is not None:
+            if sent:
+                flash("Повторное письмо было отправлено вам на почту", "success")
+            else:
+                flash(MAIL_DELAYED_MESSAGE, "warning")
             session['last_confirmation_email'] = current_time.isoformat()
-            flash("Повторное письмо было отправлено вам на почту", "success")
         else:
             flash("Пользователь не найден", "danger")
 
@@ -233,7 +285,8 @@ def confirm_email_info():
 def confirm_email_token(token):
     """Подтверждает подлинность почты пользователя"""
     try:
-        user = User.verify_email_confirm_token(token)  # Попытка расшифровать токен и получить пользователя
+        token_data = User.load_token(token, CONFIRM_TOKEN_SALT)  # Попытка расшифровать токен
+        user = user_session().get(User, token_data['user_id']) if token_data else None
     except SQLAlchemyError:
         flash("Произошла ошибка при подключении к базе данных. Попробуйте позже.", 'danger')
         return redirect(url_for('user.register'))
@@ -244,12 +297,18 @@ def confirm_email_token(token):
             flash("Почта уже подтверждена", 'info')
         else:
             user.is_confirmed = True
+        consume_token(token_data)
 
         try:
-            db.session.commit()
+            commit_users()
+            audit('email_confirmed', user)
             flash("Вы успешно зарегестрированы", 'success')
+        except IntegrityError:
+            rollback_users()
+            flash("Почтовый ящик не найден", 'danger')
+            return redirect(url_for('user.register'))
         except SQLAlchemyError:
-            db.session.rollback()
+            rollback_users()
             flash("Ошибка при подтверждении email. Попробуйте позже.", 'danger')
             return redirect(url_for('user.register'))
         return redirect(url_for('main.home'))
@@ -260,7 +319,7 @@ def confirm_email_token(token):
 
 
 @main_bp.route('/profile')
-@login_required
+@permission_required(Permission.VIEW_PROFILE)
 def profile():
     return 'Это защищённая страница для залогиненных пользователей'
 
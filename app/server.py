@@ -0,0 +1,308 @@
+"""Pre-fork сервер для продакшена.
+
+    python -m app.server --bind 0.0.0.0:8000 --workers 4
+
+Мастер один раз создает приложение, прогревает общие части и форкает воркеров:
+память приложения делится между ними copy-on-write. Каждый воркер перед приемом
+запросов открывает соединения с БД. SIGHUP — перезагрузка без простоя: мастер
+перечитывает .env и config.py, поднимает новое поколение воркеров и только после
+их готовности мягко останавливает старое. SIGTERM/SIGINT — мягкая остановка.
+Код приложения при SIGHUP не перезагружается, для этого нужен перезапуск мастера.
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Callable
+
+from dotenv import load_dotenv
+from flask import Flask, url_for
+from werkzeug.serving import make_server
+
+from .background import stop_background
+from .health import named_engines, ping
+from .models import CONFIRM_TOKEN_SALT, RESET_TOKEN_SALT, token_serializer
+
+log = logging.getLogger('app.server')
+
+
+def warm_up(app: Flask, databases: bool = True, connections: int = 2) -> None:
+    """Делает до первого запроса то, что иначе делал бы первый запрос: компилирует шаблоны
+    и карту URL, создает подписчиков токенов, открывает соединения и читает отозванные токены"""
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    with app.test_request_context():
+        url_for('main.home')  # Компиляция карты URL при первом связывании
+        for salt in (RESET_TOKEN_SALT, CONFIRM_TOKEN_SALT):
+            serializer = token_serializer(salt)
+            serializer.loads(serializer.dumps('warm-up'))
+
+    if not databases:
+        return
+    with app.app_context():
+        for name, (engine, _required) in named_engines().items():
+            # Одновременно берем несколько соединений, чтобы пул открыл их заранее
+            held = []
+            try:
+                for _ in range(connections):
+                    held.append(engine.connect())
+                ping(engine)
+            except Exception:
+                log.warning(f"Прогрев {name}: база недоступна", exc_info=True)
+            finally:
+                for conn in held:
+                    conn.close()
+        try:
+            app.extensions['token_revocations'].is_revoked('warm-up')
+        except Exception:
+            log.warning("Прогрев: не удалось прочитать отозванные токены", exc_info=True)
+
+
+class PreforkServer:
+    """Мастер-процесс: слушающий сокет, поколения воркеров, сигналы"""
+
+    def __init__(self, factory: Callable[[], Flask], host: str, port: int, workers: int,
+                 threaded: bool = True, graceful_timeout: float = 30, ready_timeout: float = 30,
+                 warm: bool = True) -> None:
+        self.factory = factory
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.threaded = threaded
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        self.warm = warm
+
+        self.app: Flask | None = None
+        self.sock: socket.socket | None = None
+        self.workers: set[int] = set()
+        self._retiring: dict[int, float] = {}  # pid -> когда убить принудительно
+        self._reload = False
+        self._stop = False
+
+    def run(self) -> None:
+        self.sock = socket.create_server((self.host, self.port), backlog=2048)
+        self.sock.set_inheritable(True)
+        self.port = self.sock.getsockname()[1]
+        self.app = self._preload()
+        log.info(f"Мастер {os.getpid()} слушает {self.host}:{self.port}, воркеров: {self.worker_count}")
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, '_reload', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, '_stop', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, '_stop', True))
+
+        workers = self._spawn_generation(self.app)
+        if workers is None:
+            # Воркеры не стартуют и при этой конфигурации: мастер без них только держал бы порт
+            self.sock.close()
+            log.error(f"Мастер {os.getpid()} остановлен: воркеры не поднялись")
+            sys.exit(1)
+        self.workers = workers
+        try:
+            while not self._stop:
+                if self._reload:
+                    self._reload = False
+                    self._reload_workers()
+                self._reap()
+                time.sleep(0.2)
+        finally:
+            self._terminate(self.workers)
+            self._wait_retiring(force=True)
+            self.sock.close()
+            log.info(f"Мастер {os.getpid()} остановлен")
+
+    def _preload(self, reload: bool = False) -> Flask:
+        if reload:
+            load_dotenv(override=True)
+            importlib.reload(importlib.import_module('config'))
+        started = time.perf_counter()
+        app = self.factory()
+        if self.warm:
+            warm_up(app, databases=False)
+        # Объекты, созданные до форка, сборщик мусора больше не трогает: страницы остаются общими
+        gc.collect()
+        gc.freeze()
+        log.info(f"Приложение загружено за {(time.perf_counter() - started) * 1000:.0f} мс")
+        return app
+
+    def _spawn_generation(self, app: Flask) -> set[int] | None:
+        """Форкает воркеров и ждет сигнала готовности от каждого. None — не все успели"""
+
+        read_fd, write_fd = os.pipe()
+        started = time.perf_counter()
+        pids = {self._spawn(app, write_fd) for _ in range(self.worker_count)}
+        os.close(write_fd)
+
+        ready = 0
+        deadline = time.monotonic() + self.ready_timeout
+        while ready < len(pids) and time.monotonic() < deadline:
+            readable, _, _ = select.select([read_fd], [], [], max(deadline - time.monotonic(), 0))
+            if not readable:
+                break
+            chunk = os.read(read_fd, len(pids))
+            if not chunk:
+                break  # Все воркеры закрыли канал: часть из них упала при старте
+            ready += len(chunk)
+        os.close(read_fd)
+
+        if ready < len(pids):
+            log.error(f"Готовы {ready} из {len(pids)} воркеров")
+            self._terminate(pids, graceful=False)
+            return None
+        log.info(f"Воркеры готовы за {(time.perf_counter() - started) * 1000:.0f} мс")
+        return pids
+
+    def _spawn(self, app: Flask, ready_fd: int | None = None) -> int:
+        pid = os.fork()
+        if pid:
+            return pid
+        code = 1
+        try:
+            self._run_worker(app, ready_fd)
+            code = 0
+        except BaseException:
+            log.exception(f"Воркер {os.getpid()} упал")
+        finally:
+            os._exit(code)
+
+    def _run_worker(self, app: Flask, ready_fd: int | None) -> None:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)  # До запуска сервера останавливаться сразу
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        started = time.perf_counter()
+
+        # Соединения мастера (если были) остаются ему: воркер открывает свои
+        with app.app_context():
+            for engine, _required in named_engines().values():
+                engine.dispose(close=False)
+        if self.warm:
+            warm_up(app)
+
+        server = make_server(self.host, self.port, app, threaded=self.threaded, fd=self.sock.fileno())
+        server.multiprocess = True
+        server.daemon_threads = False  # server_close дождется запросов в обработке
+        server.block_on_close = True
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+        log.info(f"Воркер {os.getpid()} готов за {(time.perf_counter() - started) * 1000:.0f} мс")
+        if ready_fd is not None:
+            os.write(ready_fd, b'1')
+            os.close(ready_fd)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            stop_background(app)
+
+    def _reload_workers(self) -> None:
+        log.info("SIGHUP: перезагрузка воркеров")
+        try:
+            app = self._preload(reload=True)
+        except Exception:
+            log.exception("Не удалось загрузить приложение, остаются старые воркеры")
+            return
+        new_workers = self._spawn_generation(app)
+        if new_workers is None:
+            log.error("Новое поколение не поднялось, остаются старые воркеры")
+            retired = app
+        else:
+            retired, old_workers = self.app, self.workers
+            self.workers, self.app = new_workers, app
+            self._terminate(old_workers)
+        self._release_app(retired)
+        del app, retired
+        # gc.freeze() в _preload заморозил и прежнее приложение: размораживаем, собираем его и замораживаем снова
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+    @staticmethod
+    def _release_app(app: Flask) -> None:
+        """Отпускает ненужное мастеру приложение: обработчики atexit фоновых сбросов
+        держат его вместе с движками до выхода процесса"""
+
+        stop_background(app)
+        with app.app_context():
+            for engine, _required in named_engines().values():
+                engine.dispose()
+
+    def _terminate(self, pids: set[int], graceful: bool = True) -> None:
+        deadline = time.monotonic() + (self.graceful_timeout if graceful else 0)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM if graceful else signal.SIGKILL)
+            except ProcessLookupError:
+                continue
+            self._retiring[pid] = deadline
+        if not graceful:
+            self._wait_retiring(force=True)
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                break
+            if self._retiring.pop(pid, None) is not None or pid not in self.workers:
+                continue
+            # Воркер умер сам: заменяем его, не дожидаясь остальных
+            log.warning(f"Воркер {pid} завершился с кодом {os.waitstatus_to_exitcode(status)}, перезапуск")
+            self.workers.discard(pid)
+            self.workers.add(self._spawn(self.app))
+        self._wait_retiring()
+
+    def _wait_retiring(self, force: bool = False) -> None:
+        """Добивает воркеры, не успевшие завершиться; force=True — ждет их всех"""
+
+        while self._retiring:
+            for pid, deadline in list(self._retiring.items()):
+                if time.monotonic() >= deadline:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    del self._retiring[pid]
+            if not force:
+                return
+            time.sleep(0.05)
+
+
+def serve(factory: Callable[[], Flask], bind: str = '127.0.0.1:8000', workers: int | None = None,
+          **options) -> None:
+    host, _, port = bind.rpartition(':')
+    PreforkServer(factory, host or '0.0.0.0', int(port), workers or os.cpu_count() or 1, **options).run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default='127.0.0.1:8000', help='host:port')
+    parser.add_argument('--workers', type=int, default=None, help='по умолчанию — число CPU')
+    parser.add_argument('--graceful-timeout', type=float, default=30)
+    parser.add_argument('--ready-timeout', type=float, default=30)
+    parser.add_argument('--no-threads', dest='threaded', action='store_false')
+    parser.add_argument('--no-warm-up', dest='warm', action='store_false')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(message)s', stream=sys.stderr)
+    from app import create_app
+    serve(create_app, args.bind, args.workers, threaded=args.threaded, warm=args.warm,
+          graceful_timeout=args.graceful_timeout, ready_timeout=args.ready_timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import _app_ctx_id
+from sqlalchemy import create_engine, delete, insert, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+from app import db
+from .models import User, UserDirectory
+from .tokens import PENDING_REVOCATIONS_KEY
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def shard_for_email(email: str, shard_count: int) -> int:
+    """Номер шарда по нормализованному email. blake2b, а не hash(): результат не зависит от процесса"""
+
+    digest = hashlib.blake2b(normalize_email(email).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+
+def _email_criterion(statement) -> str | None:
+    """Достает email из условия вида User.email == :value, если оно стоит в WHERE через AND"""
+
+    where = getattr(statement, 'whereclause', None)
+    if where is None:
+        return None
+    clauses = where.clauses if isinstance(where, BooleanClauseList) and where.operator is operators.and_ else [where]
+    for clause in clauses:
+        if (isinstance(clause, BinaryExpression) and clause.operator is operators.eq
+                and isinstance(clause.right, BindParameter)
+                and getattr(clause.left, 'key', None) == 'email'
+                and getattr(getattr(clause.left, 'table', None), 'name', None) == User.__tablename__):
+            return clause.right.effective_value
+    return None
+
+
+class UserShards:
+    """Строки User лежат в USER_SHARD_URIS, шард выбирается по хэшу email.
+    Справочник UserDirectory в основной БД связывает ID пользователя с шардом"""
+
+    def __init__(self, app: Flask) -> None:
+        uris = app.config['USER_SHARD_URIS']
+        self.engines = {shard: create_engine(uri) for shard, uri in enumerate(uris)}
+        self.shard_count = app.config.get('USER_SHARD_COUNT') or len(uris)
+        if not 0 < self.shard_count <= len(uris):
+            raise ValueError("USER_SHARD_COUNT должен быть от 1 до числа USER_SHARD_URIS")
+
+        # LRU-кэш справочника: ID не меняет шард до ребалансировки
+        self._shard_by_id: OrderedDict[int, int] = OrderedDict()
+        self.cache_size = app.config['USER_SHARD_CACHE_SIZE']
+        self._lock = threading.Lock()
+        self.session = scoped_session(sessionmaker(
+            class_=ShardedSession,
+            shards=self.engines,
+            shard_chooser=self._shard_for_instance,
+            identity_chooser=self._shards_for_identity,
+            execute_chooser=self._shards_for_statement,
+        ), scopefunc=_app_ctx_id)
+        app.teardown_appcontext(lambda exc: self.session.remove())
+
+    def create_tables(self) -> None:
+        for engine in self.engines.values():
+            User.__table__.create(engine, checkfirst=True)
+
+    def shard_for(self, email: str) -> int:
+        return shard_for_email(email, self.shard_count)
+
+    def shard_of_id(self, user_id: int) -> int | None:
+        with self._lock:
+            shard = self._shard_by_id.get(user_id)
+            if shard is not None:
+                self._shard_by_id.move_to_end(user_id)
+                return shard
+        shard = db.session.execute(select(UserDirectory.shard).where(UserDirectory.id == user_id)).scalar()
+        if shard is not None:
+            with self._lock:
+                self._shard_by_id[user_id] = shard
+                while len(self._shard_by_id) > self.cache_size:
+                    self._shard_by_id.popitem(last=False)
+        return shard
+
+    def forget(self) -> None:
+        with self._lock:
+            self._shard_by_id.clear()
+
+    def _shard_for_instance(self, mapper, instance, clause=None):
+        if instance is None:
+            raise ValueError("Массовые операции над User при шардировании выполняются по каждому шарду отдельно")
+        return self.shard_for(instance.email)
+
+    def _shards_for_identity(self, mapper, primary_key, **kwargs):
+        shard = self.shard_of_id(int(primary_key[0]))
+        return [shard] if shard is not None else []
+
+    def _shards_for_statement(self, context):
+        email = _email_criterion(context.statement)
+        return [self.shard_for(email)] if email is not None else list(self.engines)
+
+
+def init_sharding(app: Flask) -> None:
+    if app.config.get('USER_SHARD_URIS'):
+        app.extensions['user_shards'] = UserShards(app)
+    app.cli.add_command(shards_cli)
+
+
+def get_shards() -> UserShards | None:
+    return current_app.extensions.get('user_shards')
+
+
+def user_session():
+    """Сессия для работы с User: шардированная или обычная db.session"""
+
+    shards = get_shards()
+    return shards.session if shards is not None else db.session
+
+
+def username_or_email_taken(username: str, email: str) -> bool:
+    shards = get_shards()
+    if shards is None:
+        stmt = select(User.id).where(or_(User.username == username, User.email == email))
+    else:
+        stmt = select(UserDirectory.id).where(
+            or_(UserDirectory.username == username, UserDirectory.email == normalize_email(email)))
+    return db.session.execute(stmt).first() is not None
+
+
+def save_new_user(user: User) -> None:
+    """Сохраняет нового пользователя. При шардировании сначала резервирует ID, имя и email
+    в справочнике, затем пишет строку в свой шард; при ошибке резерв снимается"""
+
+    shards = get_shards()
+    if shards is None:
+        db.session.add(user)
+        db.session.commit()
+        return
+
+    shard = shards.shard_for(user.email)
+    entry = UserDirectory(username=user.username, email=normalize_email(user.email), shard=shard)
+    db.session.add(entry)
+    db.session.commit()
+
+    user.id = entry.id
+    try:
+        shards.session.add(user)
+        shards.session.commit()
+    except SQLAlchemyError:
+        shards.session.rollback()
+        db.session.delete(entry)
+        db.session.commit()
+        raise
+
+
+def commit_users() -> None:
+    """Фиксирует изменения основной БД (отзывы токенов и т.п.), затем изменения пользователей в шардах.
+
+    Общей транзакции у основной БД и шарда нет: если шард не записался, отзывы токенов
+    из первого commit снимаются, чтобы ссылку можно было использовать повторно.
+    """
+
+    shards = get_shards()
+    revocations = list(db.session.info.get(PENDING_REVOCATIONS_KEY, ()))
+    db.session.commit()
+    if shards is None:
+        return
+    try:
+        shards.session.commit()
+    except SQLAlchemyError:
+        shards.session.rollback()
+        for store, jti, _expires_at in revocations:
+            try:
+                store.cancel(jti)
+            except SQLAlchemyError:
+                logging.exception(f"Не удалось снять отзыв токена {jti}")
+        raise
+
+
+def rollback_users() -> None:
+    db.session.rollback()
+    shards = get_shards()
+    if shards is not None:
+        shards.session.rollback()
+
+
+def engines_for_user_ids(user_ids) -> dict:
+    """Группирует ID пользователей по движкам, где лежат их строки"""
+
+    shards = get_shards()
+    if shards is None:
+        return {db.engine: list(user_ids)}
+    groups: dict = {}
+    for user_id in user_ids:
+        shard = shards.shard_of_id(user_id)
+        if shard is not None:
+            groups.setdefault(shards.engines[shard], []).append(user_id)
+    return groups
+
+
+shards_cli = AppGroup('shards', help='Шардирование таблицы пользователей')
+
+
+@shards_cli.command('init')
+def init_command():
+    """Создает таблицу пользователей во всех шардах"""
+
+    shards = get_shards()
+    if shards is None:
+        raise click.UsageError('USER_SHARD_URIS не задан')
+    shards.create_tables()
+    click.echo(f"Шардов: {len(shards.engines)}, активных: {shards.shard_count}")
+
+
+@shards_cli.command('rebalance')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def rebalance_command(batch_size):
+    """Переносит пользователей в шарды по текущему USER_SHARD_COUNT.
+
+    Выполняется при остановленном приложении: работающие процессы держат кэш справочника.
+    Порядок шагов (копия, справочник, удаление) позволяет безопасно повторить команду после сбоя.
+    """
+
+    shards = get_shards()
+    if shards is None:
+        raise click.UsageError('USER_SHARD_URIS не задан')
+    shards.create_tables()
+
+    table = User.__table__
+    moved = 0
+    after = 0
+    while True:
+        entries = db.session.execute(
+            select(UserDirectory.id, UserDirectory.email, UserDirectory.shard)
+            .where(UserDirectory.id > after).order_by(UserDirectory.id).limit(batch_size)).all()
+        if not entries:
+            break
+        after = entries[-1].id
+
+        moves: dict[tuple[int, int], list[int]] = {}
+        for entry in entries:
+            target = shards.shard_for(entry.email)
+            if target != entry.shard:
+                moves.setdefault((entry.shard, target), []).append(entry.id)
+
+        for (source, target), ids in moves.items():
+            with shards.engines[source].connect() as conn:
+                rows = [dict(row) for row in conn.execute(select(table).where(table.c.id.in_(ids))).mappings()]
+            if rows:
+                with shards.engines[target].begin() as conn:
+                    conn.execute(insert(table).prefix_with('OR REPLACE'), rows)
+            db.session.execute(update(UserDirectory).where(UserDirectory.id.in_(ids)).values(shard=target))
+            db.session.commit()
+            with shards.engines[source].begin() as conn:
+                conn.execute(delete(table).where(table.c.id.in_(ids)))
+            moved += len(ids)
+
+    shards.forget()
+    click.echo(f"Перенесено пользователей: {moved}")
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from flask import Flask, current_app
+
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Схлопывает одновременные вызовы с одним ключом: выполняется только первый,
+    остальные ждут и получают его результат. Успешный результат запоминается на ttl
+    секунд, так что повторы сразу после завершения тоже не выполняют работу заново.
+    Исключения не запоминаются, но передаются всем ожидавшим.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._calls: dict[tuple, _Call] = {}
+        self._memo: dict[tuple, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+        self.executed = 0
+        self.shared = 0  # Вызовы, дождавшиеся чужого результата
+        self.memo_hits = 0
+
+    def _join(self, key: tuple) -> tuple[_Call | None, bool, Any]:
+        """Возвращает (вызов, ведущий ли, результат из памяти)"""
+        now = time.monotonic()
+        with self._lock:
+            memo = self._memo.get(key)
+            if memo is not None:
+                if memo[0] > now:
+                    self.memo_hits += 1
+                    return None, False, memo[1]
+                del self._memo[key]
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                return call, False, None
+            call = self._calls[key] = _Call()
+            self.executed += 1
+            return call, True, None
+
+    def _finish(self, key: tuple, call: _Call) -> None:
+        with self._lock:
+            del self._calls[key]
+            if call.error is None:
+                self._memo[key] = (time.monotonic() + self.ttl, call.result)
+                self._prune()
+        call.done.set()
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._memo.items() if expires <= now]:
+            del self._memo[key]
+
+    @staticmethod
+    def _outcome(call: _Call) -> Any:
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: tuple, fn: Callable[[], Any]) -> Any:
+        call, leader, memo = self._join(key)
+        if call is None:
+            return memo
+        if not leader:
+            call.done.wait()
+            return self._outcome(call)
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result
+
+    async def do_async(self, key: tuple, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """То же для асинхронных представлений: каждое из них работает в своем цикле
+        событий, поэтому ожидание идет через поток, а не через asyncio.Future"""
+        call, leader, memo = self._join(key)
+        if call is None:
+            return memo
+        if not leader:
+            await asyncio.to_thread(call.done.wait)
+            return self._outcome(call)
+        try:
+            call.result = await fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result
+
+    def metrics(self) -> dict:
+        return {
+            'executed': self.executed,
+            'shared': self.shared,
+            'memo_hits': self.memo_hits,
+            'in_flight': len(self._calls),
+            'memo_entries': len(self._memo),
+        }
+
+
+def init_single_flight(app: Flask) -> None:
+    app.extensions['single_flight'] = SingleFlight(app.config['SINGLE_FLIGHT_TTL_SECONDS'])
+
+
+def flight_key(purpose: str, email: str) -> tuple[str, str]:
+    # Ключ — ровно та строка, по которой ищется пользователь: поиск по email
+    # регистрозависим, и результат для другого написания не должен переиспользоваться
+    return purpose, email or ''
+
+
+def single_flight(purpose: str, email: str, fn: Callable[[], Any]) -> Any:
+    """Выполняет fn один раз на (назначение, email) среди одновременных запросов"""
+
+    return current_app.extensions['single_flight'].do(flight_key(purpose, email), fn)
+
+
+async def single_flight_async(purpose: str, email: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    return await current_app.extensions['single_flight'].do_async(flight_key(purpose, email), fn)
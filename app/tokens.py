@@ -0,0 +1,134 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, current_app
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+
+from app import db
+from .background import BackgroundFlusher
+from .models import RevokedToken
+
+# Ключ в Session.info: отзывы, которые попадут в индекс в памяти после commit
+PENDING_REVOCATIONS_KEY = 'pending_revocations'
+
+
+class RevocationStore(BackgroundFlusher):
+    """Индекс использованных токенов в памяти поверх таблицы revoked_token.
+
+    Проверка отзыва — поиск во множестве без запроса к БД. Раз в
+    TOKEN_REVOCATION_REFRESH_SECONDS множество дочитывает записи, сделанные другими
+    процессами. Истекшие токены удаляются из памяти и из таблицы фоновым потоком
+    раз в TOKEN_REVOCATION_PRUNE_SECONDS, чтобы DELETE не попадал на путь запроса.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        super().__init__(app, app.config['TOKEN_REVOCATION_PRUNE_SECONDS'], 'token-revocations')
+        self.refresh_interval = app.config['TOKEN_REVOCATION_REFRESH_SECONDS']
+        self._revoked: dict[str, datetime] = {}  # jti -> когда токен истекает сам
+        self._lock = threading.Lock()
+        self._synced_id = 0  # id последней прочитанной записи
+        self._next_refresh = 0.0
+        self._next_prune = time.monotonic() + self.interval
+
+    def is_revoked(self, jti: str | None) -> bool:
+        if not jti:
+            return True
+        self.wake()
+        self._maybe_refresh()
+        return jti in self._revoked
+
+    def revoke(self, jti: str, expires_at: datetime, db_session=None) -> None:
+        """Отзывает токен вместе с текущей транзакцией сессии; в индекс в памяти токен
+        попадает только после успешного commit. Повторное использование токена другим
+        процессом упадет на первичном ключе при commit"""
+
+        expires_at = expires_at.replace(tzinfo=None)
+        db_session = db_session or db.session
+        db_session.add(RevokedToken(jti=jti, expires_at=expires_at,
+                                    revoked_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+        db_session.info.setdefault(PENDING_REVOCATIONS_KEY, []).append((self, jti, expires_at))
+
+    def remember(self, jti: str, expires_at: datetime) -> None:
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def cancel(self, jti: str) -> None:
+        """Снимает уже зафиксированный отзыв, если изменение, ради которого токен
+        использовался, записать не удалось"""
+
+        table = RevokedToken.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.jti == jti))
+        with self._lock:
+            self._revoked.pop(jti, None)
+
+    def refresh_soon(self) -> None:
+        self._next_refresh = 0.0
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() < self._next_refresh:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_refresh:
+                return
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            self._refresh()
+
+    def _refresh(self) -> None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        table = RevokedToken.__table__
+        # Курсор — id, а не revoked_at: время ставится до commit, и запись, зафиксированная
+        # позже более новой, осталась бы непрочитанной. SQLite пишет транзакции по одной,
+        # поэтому id растут в порядке фиксации
+        stmt = select(table.c.id, table.c.jti, table.c.expires_at).where(
+            table.c.id > self._synced_id, table.c.expires_at > now)
+
+        with db.engine.connect() as conn:
+            for row_id, jti, expires_at in conn.execute(stmt):
+                self._revoked[jti] = expires_at
+                self._synced_id = max(self._synced_id, row_id)
+
+    def has_pending(self) -> bool:
+        return time.monotonic() >= self._next_prune
+
+    def flush(self) -> None:
+        """Удаляет истекшие токены: они и так не пройдут проверку подписи по сроку"""
+
+        self._next_prune = time.monotonic() + self.interval
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        table = RevokedToken.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.expires_at <= now))
+        with self._lock:
+            for jti in [jti for jti, expires_at in self._revoked.items() if expires_at <= now]:
+                del self._revoked[jti]
+
+
+@event.listens_for(Session, 'after_commit')
+def _remember_committed(session) -> None:
+    for store, jti, expires_at in session.info.pop(PENDING_REVOCATIONS_KEY, ()):
+        store.remember(jti, expires_at)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back(session, previous_transaction) -> None:
+    # Пароль не сменился — ссылка должна остаться рабочей для повторной попытки. Если же
+    # откат вызван тем, что токен уже отозван другим процессом, его запись дочитается сразу
+    for store, _jti, _expires_at in session.info.pop(PENDING_REVOCATIONS_KEY, ()):
+        store.refresh_soon()
+
+
+def init_tokens(app: Flask) -> None:
+    app.extensions['token_revocations'] = RevocationStore(app)
+
+
+def consume_token(token_data: dict, db_session=None) -> None:
+    """Делает токен одноразовым; запись в БД фиксируется ближайшим commit сессии"""
+
+    expires_at = token_data['issued_at'] + timedelta(seconds=token_data['max_age'])
+    current_app.extensions['token_revocations'].revoke(token_data['jti'], expires_at, db_session)
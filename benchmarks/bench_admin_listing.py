@@ -0,0 +1,71 @@
+"""Keyset- против OFFSET-пагинации и префиксный поиск на большой таблице пользователей.
+
+    python benchmarks/bench_admin_listing.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.admin import PAGE_SIZE, select_users_page  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+def seed(rows: int, batch: int = 50_000) -> None:
+    roles = ('user', 'user', 'user', 'moderator', 'admin')
+    with db.engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(insert(User.__table__), [
+                {'username': f'user{i:07d}', 'email': f'user{i:07d}@example.com', 'password_hash': 'x',
+                 'is_confirmed': i % 3 != 0, 'role': roles[i % len(roles)]}
+                for i in range(start, min(start + batch, rows))
+            ])
+
+
+def timed(stmt, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.session.execute(stmt).scalars().all()
+        best = min(best, time.perf_counter() - start)
+        db.session.expunge_all()
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"SECRET_KEY": "bench", "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp}/bench.db"})
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            seed(args.rows)
+            print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f} s")
+
+            print(f"{'depth':>10} {'offset ms':>10} {'keyset ms':>10}")
+            for depth in (0, args.rows // 10, args.rows // 2, args.rows - PAGE_SIZE):
+                offset_stmt = select(User).order_by(User.id).offset(depth).limit(PAGE_SIZE)
+                keyset_stmt = select_users_page(after=depth, limit=PAGE_SIZE)
+                print(f"{depth:>10} {timed(offset_stmt):>10.2f} {timed(keyset_stmt):>10.2f}")
+
+            for label, stmt in (
+                ('prefix, 10k matches', select_users_page(q='user001')),
+                ('prefix, 1k matches', select_users_page(q='user0123')),
+                ('role filter, deep', select_users_page(role='admin', after=args.rows // 2)),
+                ('confirmed filter, deep', select_users_page(is_confirmed=False, after=args.rows // 2)),
+            ):
+                print(f"{label:>24}: {timed(stmt):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Сравнение пропускной способности синхронных и асинхронных пользовательских маршрутов.
+
+Поднимает приложение на локальном сервере Werkzeug, имитирует медленный SMTP
+задержкой в mail.send и отправляет параллельные запросы на сброс пароля. Каждый
+запрос идет от своего пользователя: иначе single-flight отвечал бы из памяти без отправки.
+
+    python benchmarks/bench_async_views.py --concurrency 50 --requests 500
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.background import stop_background  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+def build_app(async_views: bool, db_path: str, users: int):
+    app = create_app({
+        "TESTING": True,
+        "SECRET_KEY": "bench",
+        "ASYNC_VIEWS": async_views,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "WTF_CSRF_ENABLED": False,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(User(username=f'bench{i}', email=f'bench{i}@example.com', is_confirmed=True)
+                           for i in range(users))
+        db.session.commit()
+    return app
+
+
+def run(async_views: bool, concurrency: int, total: int, smtp_latency: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(async_views, os.path.join(tmp, 'bench.db'), total)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_port}/user/reset_password"
+
+        def one_request(i):
+            body = urllib.parse.urlencode({'email': f'bench{i}@example.com'}).encode()
+            start = time.perf_counter()
+            # Новая сессия на каждый запрос, чтобы не срабатывал 60-секундный лимит
+            urllib.request.urlopen(urllib.request.Request(url, data=body)).read()
+            return time.perf_counter() - start
+
+        with patch('app.email_utils.mail.send', side_effect=lambda msg: time.sleep(smtp_latency)):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = sorted(pool.map(one_request, range(total)))
+            elapsed = time.perf_counter() - started
+
+        server.shutdown()
+        stop_background(app)  # Последний сброс буферов, пока файл БД еще существует
+        return {
+            'mode': 'async' if async_views else 'sync',
+            'rps': total / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--smtp-latency', type=float, default=0.05, help='задержка SMTP в секундах')
+    parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    modes = {'sync': [False], 'async': [True], 'both': [False, True]}[args.mode]
+    for async_views in modes:
+        result = run(async_views, args.concurrency, args.requests, args.smtp_latency)
+        print(f"{result['mode']:>5}: {result['rps']:8.1f} req/s  "
+              f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Байты на проводе и CPU на запрос со сжатием ответов и без него.
+
+    python benchmarks/bench_compression.py --requests 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import url_for  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+
+def make_css(path: str, rules: int = 2000) -> None:
+    """Таблица стилей размером с типичный CSS-фреймворк"""
+    with open(path, 'w') as file:
+        for i in range(rules):
+            file.write(f".block-{i} {{ margin: {i % 16}px; padding: {i % 8}px {i % 12}px; "
+                       f"color: #{i * 2654435761 % 0xFFFFFF:06x}; display: flex; }}\n")
+
+
+def wire_bytes(response) -> int:
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers)
+    return headers + len(response.data)
+
+
+def measure(app, url: str, requests: int) -> tuple[float, float]:
+    client = app.test_client()
+    headers = {'Accept-Encoding': 'gzip, deflate'}
+    client.get(url, headers=headers)  # Прогрев: шаблоны, хэши статики, кэш сжатия
+
+    total = 0
+    cpu = time.process_time()
+    for _ in range(requests):
+        total += wire_bytes(client.get(url, headers=headers))
+    cpu = time.process_time() - cpu
+    return total / requests, cpu / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_css(os.path.join(tmp, 'site.css'))
+        apps = {}
+        for enabled in (False, True):
+            app = create_app({"SECRET_KEY": "bench", "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp}/bench.db",
+                              "SERVER_NAME": "localhost", "COMPRESSION_ENABLED": enabled})
+            app.static_folder = tmp
+            with app.app_context():
+                db.create_all()
+            apps[enabled] = app
+
+        with apps[True].app_context():
+            static_url = url_for('static', filename='site.css', _external=False)
+
+        print(f"{'url':>28} {'off B':>9} {'on B':>9} {'off us':>8} {'on us':>8}")
+        for url in ('/user/register', '/user/login', '/readyz', static_url):
+            off_bytes, off_cpu = measure(apps[False], url, args.requests)
+            on_bytes, on_cpu = measure(apps[True], url, args.requests)
+            print(f"{url[:28]:>28} {off_bytes:>9.0f} {on_bytes:>9.0f} {off_cpu:>8.0f} {on_cpu:>8.0f}")
+
+        print(apps[True].extensions['compression'].metrics())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Время старта воркеров pre-fork сервера и задержка первого запроса с прогревом и без.
+
+    python benchmarks/bench_prefork.py --workers 4 --runs 5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import logging, sys
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+from app import create_app
+from app.extensions import db
+from app.server import serve
+
+def factory():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'SECRET_KEY': 'bench'})
+    with app.app_context():
+        db.create_all()
+    return app
+
+serve(factory, '127.0.0.1:0', workers=int(sys.argv[2]), warm=sys.argv[3] == 'warm')
+"""
+
+
+def request_ms(port: int, path: str) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=10) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_once(db_uri: str, workers: int, warm: bool, path: str) -> dict:
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', CHILD, db_uri, str(workers), 'warm' if warm else 'cold'],
+                            cwd=ROOT, stderr=subprocess.PIPE, text=True)
+    try:
+        port, worker_ms = None, []
+        for line in proc.stderr:
+            if match := re.search(r'слушает 127\.0\.0\.1:(\d+)', line):
+                port = int(match.group(1))
+            elif match := re.search(r'Воркер \d+ готов за (\d+) мс', line):
+                worker_ms.append(int(match.group(1)))
+            elif 'Воркеры готовы' in line:
+                break
+        boot_ms = (time.perf_counter() - started) * 1000
+        # С одним воркером второй запрос гарантированно попадает в тот же процесс
+        first = request_ms(port, path)
+        second = request_ms(port, path)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {'boot_ms': boot_ms, 'worker_ms': statistics.mean(worker_ms), 'first_ms': first, 'second_ms': second}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/user/login')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_uri = f"sqlite:///{tmp}/bench.db"
+        print(f"{'mode':>6} {'boot ms':>9} {'worker ms':>10} {'1st req ms':>11} {'2nd req ms':>11}")
+        for warm in (False, True):
+            boots = [run_once(db_uri, args.workers, warm, args.path) for _ in range(args.runs)]
+            firsts = [run_once(db_uri, 1, warm, args.path) for _ in range(args.runs)]
+            print(f"{'warm' if warm else 'cold':>6} "
+                  f"{statistics.median(r['boot_ms'] for r in boots):>9.0f} "
+                  f"{statistics.median(r['worker_ms'] for r in boots):>10.0f} "
+                  f"{statistics.median(r['first_ms'] for r in firsts):>11.1f} "
+                  f"{statistics.median(r['second_ms'] for r in firsts):>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Пропускная способность записей пользователей при разном числе шардов SQLite.
+
+Параллельные потоки регистрируют пользователей и меняют им пароли. Хэширование
+пароля исключено, чтобы измерять именно конкуренцию за блокировку записи.
+
+    python benchmarks/bench_sharding.py --shards 1 2 4 8 --threads 16 --ops 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User  # noqa: E402
+from app.routes import get_user_by_email  # noqa: E402
+from app.sharding import commit_users, rollback_users, save_new_user  # noqa: E402
+
+
+def build_app(tmp: str, shards: int):
+    app = create_app({
+        "SECRET_KEY": "bench",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp}/primary.db",
+        "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 30}},
+        "USER_SHARD_URIS": [f"sqlite:///{tmp}/users_{i}.db" for i in range(shards)],
+        "BACKGROUND_FLUSH": False,
+    })
+    with app.app_context():
+        db.create_all()
+        app.extensions['user_shards'].create_tables()
+    return app
+
+
+def run_threads(app, threads: int, ops: int, work) -> float:
+    def worker(thread_id):
+        for i in range(ops):
+            with app.app_context():
+                for _ in range(20):
+                    try:
+                        work(thread_id, i)
+                        break
+                    except OperationalError:  # database is locked — повтор
+                        rollback_users()
+                        time.sleep(0.005)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return threads * ops / (time.perf_counter() - started)
+
+
+def register(thread_id, i):
+    user = User(username=f'u{thread_id}_{i}', email=f'u{thread_id}_{i}@example.com', password_hash='x')
+    save_new_user(user)
+
+
+def change_password(thread_id, i):
+    user = get_user_by_email(f'u{thread_id}_{i}@example.com')
+    user.password_hash = f'y{i}'
+    commit_users()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=200, help='операций на поток')
+    args = parser.parse_args()
+
+    print(f"{'shards':>6} {'register/s':>12} {'password/s':>12}")
+    for shards in args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = build_app(tmp, shards)
+            registrations = run_threads(app, args.threads, args.ops, register)
+            updates = run_threads(app, args.threads, args.ops, change_password)
+            print(f"{shards:>6} {registrations:>12.1f} {updates:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
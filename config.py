@@ -10,12 +10,79 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Реплики для чтения {имя: URI}, выбираются по кругу
+    SQLALCHEMY_READ_REPLICAS = {}
+    SQLALCHEMY_REPLICA_RETRY_SECONDS = 30  # Сколько не обращаться к упавшей реплике
+    READ_YOUR_WRITES_SECONDS = 5  # Сколько читать с основной БД после записи клиента
+
+    # Шардирование пользователей по хэшу email: список файлов БД шардов (пустой — без шардирования).
+    # USER_SHARD_COUNT меньше числа URI нужен только на время ребалансировки при уменьшении числа шардов
+    USER_SHARD_URIS = []
+    USER_SHARD_COUNT = None
+    USER_SHARD_CACHE_SIZE = 10000  # Сколько пар ID -> шард из справочника держать в памяти
+
+    # Асинхронные пользовательские маршруты (нужны пакеты asgiref и aiosqlite)
+    ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+    ASYNC_SQLALCHEMY_DATABASE_URI = None  # По умолчанию выводится из SQLALCHEMY_DATABASE_URI
+
+    # Права ролей (имена из app.permissions.Permission), компилируются в битовые маски при запуске
+    ROLE_PERMISSIONS = {
+        'user': ['VIEW_PROFILE'],
+        'moderator': ['VIEW_PROFILE', 'MANAGE_USERS'],
+        'admin': ['VIEW_PROFILE', 'MANAGE_USERS', 'ADMIN'],
+    }
+
+    # Фоновые потоки сброса буферов в БД; None — включены везде, кроме TESTING
+    BACKGROUND_FLUSH = None
+
+    # Журнал аудита: события пишутся пачками из буфера в памяти
+    AUDIT_FLUSH_INTERVAL_MS = 500
+    AUDIT_BATCH_SIZE = 100
+    AUDIT_BUFFER_SIZE = 10000
+    AUDIT_OVERFLOW_POLICY = 'drop_oldest'  # drop_oldest, drop_newest или block
+    AUDIT_BLOCK_TIMEOUT_MS = 50  # Сколько ждать места в буфере при политике block
+
+    # Отметки last_seen_at/last_login_at: не чаще одной записи на пользователя за окно
+    ACTIVITY_DEBOUNCE_SECONDS = 300
+    ACTIVITY_FLUSH_INTERVAL_SECONDS = 30
+
+    # Сколько помнить результат отправки письма сброса/подтверждения для того же адреса
+    SINGLE_FLIGHT_TTL_SECONDS = 5
+
+    # /readyz: таймаут пинга БД и время жизни закэшированного результата проверки
+    READINESS_DB_TIMEOUT_MS = 500
+    READINESS_CACHE_MS = 300
+
+    # Как часто индекс отозванных токенов в памяти дочитывает таблицу и чистит истекшие
+    TOKEN_REVOCATION_REFRESH_SECONDS = 30
+    # Как часто фоновый поток удаляет истекшие отзывы из памяти и таблицы
+    TOKEN_REVOCATION_PRUNE_SECONDS = 600
+
+    # Сжатие ответов gzip/deflate в WSGI-слое и кэш сжатой статики
+    COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_SIZE = 500  # Байт; меньшие ответы сжимать невыгодно
+    COMPRESSION_LEVEL = 6
+    COMPRESSION_CACHE_SIZE = 256  # Сколько сжатых статических файлов держать в памяти
+    # Статика по URL с хэшем содержимого кэшируется браузером на год
+    STATIC_MAX_AGE_SECONDS = 31536000
+
     MAIL_SERVER = 'smtp.mail.ru'
     MAIL_PORT = 465
     MAIL_USE_SSL = True
     MAIL_USERNAME = os.environ.get('EMAIL_USER')
     MAIL_PASSWORD = os.environ.get('EMAIL_PASS')
 
+    # Таймауты SMTP: подключение и каждая операция с сокетом после него, секунды
+    MAIL_CONNECT_TIMEOUT = 5
+    MAIL_SEND_TIMEOUT = 10
+    # Автомат SMTP: после N ошибок подряд отправка не пытается соединиться до конца паузы
+    MAIL_BREAKER_FAILURE_THRESHOLD = 3
+    MAIL_BREAKER_RESET_SECONDS = 60
+    MAIL_BREAKER_HALF_OPEN_PROBES = 1  # Сколько пробных отправок пропускать после паузы
+    # Неотправленные письма ждут в памяти и повторяются фоновым потоком
+    MAIL_OUTBOX_SIZE = 1000
+    MAIL_RETRY_INTERVAL_SECONDS = 15
+
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
@@ -1,6 +1,7 @@
 import pytest
 from app import create_app
 from app.extensions import db
+from app.background import stop_background
 
 
 @pytest.fixture
@@ -15,6 +16,7 @@ def app():
     with app.app_context():
         db.create_all()
         yield app
+        stop_background(app)
         db.session.remove()
         db.drop_all()
 
@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app.activity import ActivityTracker
+from app.extensions import db
+from app.models import User
+
+
+def make_user():
+    user = User(username='denis', email='denis@example.com', is_confirmed=True)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def stored(user_id):
+    return db.session.execute(
+        select(User.last_seen_at, User.last_login_at).where(User.id == user_id)).one()
+
+
+def test_login_is_written_on_flush(client, app):
+    user = make_user()
+    client.post('/user/login', data={'email': 'denis@example.com', 'password': 'Pass1234'})
+    client.get('/profile')
+
+    tracker = app.extensions['activity']
+    assert tracker.pending() == 1
+    assert stored(user.id) == (None, None)
+
+    tracker.flush()
+    last_seen_at, last_login_at = stored(user.id)
+    assert last_login_at is not None and last_seen_at >= last_login_at
+
+
+def test_touches_are_coalesced(app):
+    user = make_user()
+    tracker = ActivityTracker(app)
+    for _ in range(5):
+        tracker.touch(user.id)
+    tracker.flush()
+
+    metrics = tracker.metrics()
+    assert metrics['rows_written'] == 1
+    assert metrics['coalescing_ratio'] == 5
+    assert metrics['flushes'] == 1 and metrics['flush_ms_last'] > 0
+
+
+def test_debounce_limits_writes_per_user(app):
+    user = make_user()
+    tracker = ActivityTracker(app)
+
+    tracker.touch(user.id)
+    tracker.flush()
+    tracker.touch(user.id)
+    tracker.flush()
+    assert tracker.rows_written == 1
+    assert tracker.pending() == 1
+
+    tracker.debounce = 0
+    tracker.flush()
+    assert tracker.rows_written == 2
+
+
+def test_stop_writes_pending_regardless_of_debounce(app):
+    user = make_user()
+    tracker = ActivityTracker(app)
+    tracker.touch(user.id)
+    tracker.flush()
+    tracker.touch(user.id)
+
+    tracker.stop()
+    assert tracker.pending() == 0
+    assert tracker.rows_written == 2
+
+
+def test_failed_flush_keeps_touches(app):
+    user = make_user()
+    tracker = ActivityTracker(app)
+    tracker.touch(user.id, login=True)
+
+    def fail(*args):
+        tracker.touch(user.id)  # Отметка, пришедшая во время неудачной записи
+        raise OperationalError('UPDATE', {}, Exception('database is locked'))
+
+    with patch.object(db.engine, 'begin', side_effect=fail):
+        with pytest.raises(OperationalError):
+            tracker.flush()
+    assert tracker.pending() == 1 and tracker.rows_written == 0
+
+    tracker.flush()
+    last_seen_at, last_login_at = stored(user.id)
+    assert last_login_at is not None and last_seen_at > last_login_at
@@ -0,0 +1,80 @@
+import pytest
+
+from app.extensions import db
+from app.models import User
+
+
+@pytest.fixture
+def admin_client(client, app):
+    admin = User(username='admin', email='admin@example.com', is_confirmed=True, role='admin')
+    admin.set_password('Pass1234')
+    db.session.add(admin)
+    for i in range(5):
+        db.session.add(User(username=f'tea{i}', email=f'tea{i}@example.com', is_confirmed=i % 2 == 0))
+    db.session.add(User(username='coffee', email='coffee@example.com', role='moderator'))
+    db.session.commit()
+
+    client.post('/user/login', data={'email': 'admin@example.com', 'password': 'Pass1234'})
+    return client
+
+
+def test_users_requires_permission(client, app):
+    user = User(username='denis', email='denis@example.com', is_confirmed=True)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+    client.post('/user/login', data={'email': 'denis@example.com', 'password': 'Pass1234'})
+
+    assert client.get('/admin/users').status_code == 403
+
+
+def test_users_keyset_pagination(admin_client):
+    first = admin_client.get('/admin/users?format=json&limit=3').get_json()
+    assert [u['username'] for u in first['users']] == ['admin', 'tea0', 'tea1']
+
+    second = admin_client.get(f"/admin/users?format=json&limit=3&after={first['next_after']}").get_json()
+    assert [u['username'] for u in second['users']] == ['tea2', 'tea3', 'tea4']
+
+    last = admin_client.get(f"/admin/users?format=json&limit=3&after={second['next_after']}").get_json()
+    assert [u['username'] for u in last['users']] == ['coffee']
+    assert last['next_after'] is None
+
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_users_limit_is_at_least_one(admin_client, limit):
+    response = admin_client.get(f'/admin/users?format=json&limit={limit}')
+    assert response.status_code == 200
+    assert [u['username'] for u in response.get_json()['users']] == ['admin']
+
+
+def test_users_prefix_search_and_filters(admin_client):
+    data = admin_client.get('/admin/users?format=json&q=tea&is_confirmed=1').get_json()
+    assert [u['username'] for u in data['users']] == ['tea0', 'tea2', 'tea4']
+
+    data = admin_client.get('/admin/users?format=json&q=coffee@').get_json()
+    assert [u['username'] for u in data['users']] == ['coffee']
+
+    data = admin_client.get('/admin/users?format=json&role=moderator').get_json()
+    assert [u['username'] for u in data['users']] == ['coffee']
+
+
+@pytest.mark.parametrize('q', ['tea\U0010ffff', '\U0010ffff', '\ud7ff'])
+def test_users_search_with_edge_characters(admin_client, q):
+    response = admin_client.get('/admin/users', query_string={'format': 'json', 'q': q})
+    assert response.status_code == 200
+    assert response.get_json()['users'] == []
+
+
+def test_users_html(admin_client):
+    response = admin_client.get('/admin/users?q=tea&limit=2')
+    assert response.status_code == 200
+    assert b'tea0@example.com' in response.data
+    assert b'after=' in response.data
+
+
+def test_export_users_csv(admin_client):
+    response = admin_client.get('/admin/users.csv?q=tea')
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'id,username,email,is_confirmed,role'
+    assert len(lines) == 6
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('asgiref')
+
+from app import create_app
+from app.async_db import to_async_uri
+from app.extensions import db
+from app.background import stop_background
+from app.models import User
+
+
+@pytest.fixture
+def async_app(tmp_path):
+    # Синхронный и асинхронный движки должны смотреть в один файл БД
+    app = create_app({
+        "TESTING": True,
+        "ASYNC_VIEWS": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'async.db'}",
+        "WTF_CSRF_ENABLED": False,
+        "SERVER_NAME": "localhost"
+    })
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        stop_background(app)
+        db.session.remove()
+        db.drop_all()
+
+
+def test_to_async_uri():
+    assert to_async_uri('sqlite:///site.db') == 'sqlite+aiosqlite:///site.db'
+    assert to_async_uri('sqlite+aiosqlite:///site.db') == 'sqlite+aiosqlite:///site.db'
+
+
+def test_async_views_reject_user_shards(tmp_path):
+    with pytest.raises(ValueError, match='USER_SHARD_URIS'):
+        create_app({
+            "TESTING": True,
+            "ASYNC_VIEWS": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'async.db'}",
+            "USER_SHARD_URIS": [f"sqlite:///{tmp_path / 'users_0.db'}"],
+        })
+
+
+def test_async_registration(async_app):
+    client = async_app.test_client()
+    response = client.post('/user/register', data={
+        'username': 'denis',
+        'email': 'denis@example.com',
+        'password': 'Pass1234',
+        'confirm_password': 'Pass1234'
+    }, follow_redirects=True)
+
+    assert 'Спасибо за регистрацию'.encode('utf-8') in response.data
+    assert db.session.query(User).filter_by(email='denis@example.com').count() == 1
+
+
+def test_async_login_and_reset(async_app):
+    user = User(username='denis', email='denis@example.com', is_confirmed=True)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+    token = user.get_reset_token()
+
+    client = async_app.test_client()
+    response = client.post(f'/user/reset_password/{token}', data={
+        'password': 'Newpass123',
+        'confirm_password': 'Newpass123'
+    }, follow_redirects=True)
+    assert 'пароль был успешно обновлён'.encode('utf-8') in response.data
+
+    response = client.post('/user/login', data={
+        'email': 'denis@example.com',
+        'password': 'Newpass123'
+    }, follow_redirects=True)
+    assert 'Вы успешно вошли!'.encode('utf-8') in response.data
+
+
+def test_concurrent_first_requests_do_not_deadlock(async_app):
+    # Каждое async-представление работает в своем цикле событий; первое соединение
+    # движка не должно оставлять блокировку, привязанную к чужому циклу
+    engine = async_app.extensions['async_db'].kw['bind']
+    event.listen(engine.sync_engine, 'connect', lambda *args: time.sleep(0.2))
+    statuses = []
+
+    def request(i):
+        statuses.append(async_app.test_client().post(
+            '/user/reset_password', data={'email': f'nobody{i}@example.com'}).status_code)
+
+    threads = [threading.Thread(target=request, args=(i,), daemon=True) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert statuses == [200] * 5
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import DatabaseError, OperationalError
+
+from app.audit import AuditLog
+from app.extensions import db
+from app.models import AuditEvent, User
+
+
+def events():
+    return [e.event for e in db.session.execute(select(AuditEvent).order_by(AuditEvent.id)).scalars()]
+
+
+def test_login_events_are_buffered(client, app):
+    user = User(username='denis', email='denis@example.com', is_confirmed=True)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+
+    client.post('/user/login', data={'email': 'denis@example.com', 'password': 'WrongPass'})
+    client.post('/user/login', data={'email': 'denis@example.com', 'password': 'Pass1234'})
+
+    log = app.extensions['audit']
+    assert log.pending() == 2
+    assert events() == []
+
+    log.flush()
+    assert events() == ['login_failed', 'login']
+    assert db.session.execute(select(AuditEvent.email)).scalars().first() == 'denis@example.com'
+
+
+def test_flush_when_batch_is_full(app):
+    app.config['AUDIT_BATCH_SIZE'] = 3
+    log = AuditLog(app)
+    for _ in range(3):
+        log.record('login')
+    assert log.pending() == 0
+    assert events() == ['login'] * 3
+
+
+@pytest.mark.parametrize('policy, expected', [('drop_oldest', ['b', 'c']), ('drop_newest', ['a', 'b'])])
+def test_overflow_policy(app, policy, expected):
+    app.config.update(AUDIT_BUFFER_SIZE=2, AUDIT_OVERFLOW_POLICY=policy)
+    log = AuditLog(app)
+    for event in ('a', 'b', 'c'):
+        log.record(event)
+
+    assert log.dropped == 1
+    log.flush()
+    assert events() == expected
+
+
+def test_failed_flush_keeps_events(app):
+    app.config.update(AUDIT_BATCH_SIZE=10, AUDIT_BUFFER_SIZE=3)
+    log = AuditLog(app)
+    for event in ('a', 'b', 'c'):
+        log.record(event)
+
+    def fail(*args):
+        log.record('d')  # Событие, пришедшее во время неудачной записи
+        raise OperationalError('INSERT', {}, Exception('down'))
+
+    with patch.object(db.engine, 'begin', side_effect=fail):
+        with pytest.raises(OperationalError):
+            log.flush()
+    # Незаписанные события вернулись в начало буфера, самое старое не поместилось
+    assert log.pending() == 3 and log.dropped == 1
+
+    log.flush()
+    assert events() == ['b', 'c', 'd']
+
+
+def test_events_are_append_only(app):
+    log = app.extensions['audit']
+    log.record('login')
+    log.flush()
+    for statement in ("UPDATE audit_event SET event = 'forged'", "DELETE FROM audit_event"):
+        with pytest.raises(DatabaseError):
+            db.session.execute(text(statement))
+        db.session.rollback()
+    assert events() == ['login']
+
+
+def test_query_cli(app):
+    log = app.extensions['audit']
+    log.record('login', user_id=1, email='denis@example.com')
+    log.record('login_failed', email='other@example.com')
+    log.flush()
+
+    result = app.test_cli_runner().invoke(args=['audit', 'query', '--event', 'login_failed', '--json'])
+    assert result.exit_code == 0
+    assert 'other@example.com' in result.output
+    assert 'denis@example.com' not in result.output
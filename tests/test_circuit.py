@@ -0,0 +1,207 @@
+import socket
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from flask_mail import Message
+
+from app.circuit import CircuitBreaker
+from app.email_utils import send_reset_password_email, MAIL_DELAYED_MESSAGE
+from app.extensions import db
+from app.models import User
+
+
+class SMTPStub:
+    """Локальный SMTP-сервер для тестов. slow=True принимает соединение и ничего не отвечает"""
+
+    def __init__(self, slow=False):
+        self.slow = slow
+        self.received = 0
+        self._hung = []
+        self._sock = socket.create_server(('127.0.0.1', 0))
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            if self.slow:
+                self._hung.append(conn)
+                continue
+            with conn:
+                self._talk(conn)
+
+    def _talk(self, conn):
+        lines = conn.makefile('rb')
+        conn.sendall(b'220 stub\r\n')
+        for line in lines:
+            command = line[:4].upper()
+            if command == b'DATA':
+                conn.sendall(b'354 go on\r\n')
+                for data in lines:
+                    if data == b'.\r\n':
+                        break
+                self.received += 1
+                conn.sendall(b'250 ok\r\n')
+            elif command == b'QUIT':
+                conn.sendall(b'221 bye\r\n')
+                return
+            else:
+                conn.sendall(b'250 ok\r\n')
+
+    def close(self):
+        self._sock.close()
+        for conn in self._hung:
+            conn.close()
+
+
+@pytest.fixture
+def smtp(app):
+    """Настраивает Flask-Mail на реальную отправку на локальную заглушку"""
+    stubs = []
+
+    def point_to(stub):
+        state = app.extensions['mail']
+        state.suppress = False
+        state.use_ssl = False
+        state.server, state.port = '127.0.0.1', stub.port
+        state.username = None
+        state.default_sender = 'noreply@example.com'
+        stubs.append(stub)
+        return stub
+
+    app.config['MAIL_CONNECT_TIMEOUT'] = 0.2
+    app.config['MAIL_SEND_TIMEOUT'] = 0.2
+    yield point_to
+    for stub in stubs:
+        stub.close()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='denis', email='denis@example.com', is_confirmed=True)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_breaker_opens_and_recovers_through_probe():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()  # Единственная пробная попытка
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.metrics()['rejected_total'] == 2
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.metrics()['opened_total'] == 2
+
+
+def test_slow_smtp_times_out_then_fails_fast(app, smtp, user):
+    smtp(SMTPStub(slow=True))
+    breaker = app.extensions['mail_breaker']
+    breaker.failure_threshold = 2
+
+    for _ in range(2):
+        started = time.monotonic()
+        assert send_reset_password_email(user) is False
+        assert time.monotonic() - started < 1  # Ограничено таймаутом, а не ожиданием сервера
+
+    started = time.monotonic()
+    assert send_reset_password_email(user) is False
+    assert time.monotonic() - started < 0.1
+
+    metrics = breaker.metrics()
+    assert metrics['state'] == 'open'
+    assert metrics['failures_total'] == 2 and metrics['rejected_total'] == 1
+    assert app.extensions['mail_outbox'].pending() == 3
+
+
+def test_outbox_resends_after_cooldown(app, smtp, user):
+    smtp(SMTPStub(slow=True))
+    breaker = app.extensions['mail_breaker']
+    breaker.failure_threshold = 1
+    send_reset_password_email(user)
+    send_reset_password_email(user)
+
+    good = smtp(SMTPStub())
+    outbox = app.extensions['mail_outbox']
+    outbox.flush()
+    assert outbox.pending() == 2  # Пауза не истекла, соединений не было
+
+    breaker.reset_timeout = 0
+    outbox.flush()
+    assert outbox.pending() == 0
+    assert good.received == 2
+    assert breaker.state == 'closed'
+
+
+def test_view_reports_delayed_email(app, client, smtp, user):
+    smtp(SMTPStub(slow=True))
+    app.extensions['mail_breaker'].failure_threshold = 1
+
+    response = client.post('/user/reset_password', data={'email': 'denis@example.com'}, follow_redirects=True)
+    assert MAIL_DELAYED_MESSAGE.encode('utf-8') in response.data
+
+
+def test_message_error_during_probe_releases_the_slot(app, user):
+    breaker = app.extensions['mail_breaker']
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    with patch('app.email_utils.mail.send', side_effect=ValueError('bad message')):
+        send_reset_password_email(user)
+    assert breaker.state == 'half_open'
+
+    with patch('app.email_utils.mail.send'):
+        assert send_reset_password_email(user) is True
+    assert breaker.state == 'closed'
+
+
+def test_outbox_drops_malformed_messages(app, user):
+    outbox = app.extensions['mail_outbox']
+    outbox.put(Message('broken', recipients=[user.email]))
+    outbox.put(Message('good', recipients=[user.email]))
+
+    def send(message):
+        if message.subject == 'broken':
+            raise ValueError('bad message')
+
+    with patch('app.extensions.mail.send', side_effect=send) as mock_send:
+        outbox.flush()
+    assert mock_send.call_count == 2
+    assert outbox.pending() == 0 and outbox.dropped == 1
+    assert app.extensions['mail_breaker'].state == 'closed'
+
+
+def test_full_outbox_drops_oldest_message(app, client, user):
+    outbox = app.extensions['mail_outbox']
+    outbox.capacity = 2
+    for subject in ('first', 'second', 'third'):
+        outbox.put(Message(subject, recipients=[user.email]))
+    assert outbox.pending() == 2 and outbox.dropped == 1
+
+    with patch('app.extensions.mail.send') as mock_send:
+        outbox.flush()
+    assert [call.args[0].subject for call in mock_send.call_args_list] == ['second', 'third']
+    assert client.get('/readyz').get_json()['mail']['outbox_dropped'] == 1
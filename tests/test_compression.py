@@ -0,0 +1,94 @@
+import gzip
+import zlib
+
+import pytest
+from flask import url_for
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from app.compression import CompressionMiddleware, negotiate
+
+CSS = b'body { margin: 0; padding: 0; color: #333; }\n' * 100
+
+
+@pytest.fixture
+def static_app(app, tmp_path):
+    (tmp_path / 'site.css').write_bytes(CSS)
+    app.static_folder = str(tmp_path)
+    return app
+
+
+def test_negotiate_respects_quality():
+    assert negotiate('gzip, deflate') == 'gzip'
+    assert negotiate('gzip;q=0.5, deflate') == 'deflate'
+    assert negotiate('gzip;q=0, deflate;q=0') is None
+    assert negotiate('*') == 'gzip'
+    assert negotiate('') is None
+
+
+def test_page_is_gzipped(client):
+    plain = client.get('/user/register')
+    response = client.get('/user/register', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert int(response.headers['Content-Length']) < len(plain.data)
+    assert gzip.decompress(response.data) == plain.data
+
+
+def test_deflate_and_identity(client):
+    plain = client.get('/user/register')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    response = client.get('/user/register', headers={'Accept-Encoding': 'deflate'})
+    assert response.headers['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(response.data) == plain.data
+
+
+def test_pages_with_csrf_token_are_not_compressed(app, client):
+    app.config['WTF_CSRF_ENABLED'] = True
+    response = client.get('/user/reset_password', headers={'Accept-Encoding': 'gzip'})
+    assert b'csrf_token' in response.data
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/healthz', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_responses_pass_through():
+    def stream():
+        yield b'id,email\n' * 1000
+
+    app = CompressionMiddleware(Response(stream(), mimetype='text/csv'))
+    response = Client(app).get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'id,email\n' * 1000
+
+
+def test_static_url_is_hashed_and_cached_for_long(static_app, client):
+    with static_app.test_request_context():
+        url = url_for('static', filename='site.css')
+    assert '?v=' in url
+
+    response = client.get(url)
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == static_app.config['STATIC_MAX_AGE_SECONDS']
+
+    stale = client.get('/static/site.css?v=0000')
+    assert not stale.cache_control.immutable
+
+
+def test_compressed_static_is_cached(static_app, client):
+    middleware = static_app.extensions['compression']
+    for _ in range(3):
+        response = client.get('/static/site.css', headers={'Accept-Encoding': 'gzip'})
+        assert gzip.decompress(response.data) == CSS
+    assert middleware.cache_misses == 1 and middleware.cache_hits == 2
+
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    revalidated = client.get('/static/site.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
@@ -0,0 +1,91 @@
+import pytest
+from flask import current_app
+from sqlalchemy import insert
+
+from app import create_app
+from app.db_routing import ReplicaRouter
+from app.extensions import db
+from app.background import stop_background
+from app.models import User
+from app.routes import get_user_by_email, load_user
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "SQLALCHEMY_READ_REPLICAS": {"replica": f"sqlite:///{tmp_path / 'replica.db'}"},
+        "WTF_CSRF_ENABLED": False,
+        "SERVER_NAME": "localhost"
+    })
+
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(app.extensions["db_routing"].engines["replica"])
+        yield app
+        stop_background(app)
+        db.session.remove()
+
+
+def add_to_replica_only(username, email):
+    with current_app.extensions["db_routing"].engines["replica"].begin() as conn:
+        conn.execute(insert(User.__table__).values(
+            id=100, username=username, email=email, password_hash='x', is_confirmed=True, role='user'))
+
+
+def test_reads_go_to_replica(replica_app):
+    add_to_replica_only('replica', 'replica@example.com')
+
+    with replica_app.test_request_context():
+        assert get_user_by_email('replica@example.com') is not None
+        assert load_user(100) is not None
+
+
+def test_read_your_writes_after_commit(replica_app):
+    with replica_app.test_request_context():
+        db.session.add(User(username='denis', email='denis@example.com'))
+        db.session.commit()
+        db.session.expunge_all()
+        # Реплика еще не получила запись, но клиент должен ее видеть
+        assert get_user_by_email('denis@example.com') is not None
+
+
+def test_register_then_reads_from_primary(replica_app):
+    client = replica_app.test_client()
+    response = client.post('/user/register', data={
+        'username': 'denis',
+        'email': 'denis@example.com',
+        'password': 'Pass1234',
+        'confirm_password': 'Pass1234'
+    }, follow_redirects=True)
+
+    assert 'Спасибо за регистрацию'.encode('utf-8') in response.data
+    with client.session_transaction() as sess:
+        assert '_read_primary_until' in sess
+
+
+def test_fallback_to_primary_when_replica_is_down(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "SQLALCHEMY_READ_REPLICAS": {"replica": f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"},
+    })
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            conn.execute(insert(User.__table__).values(
+                username='denis', email='denis@example.com', is_confirmed=True, role='user'))
+
+        assert get_user_by_email('denis@example.com') is not None
+        assert app.extensions['db_routing'].choose() is None
+        db.session.remove()
+
+
+def test_replica_router_round_robin():
+    router = ReplicaRouter({'a': None, 'b': None}, retry_after=30)
+    assert [router.choose() for _ in range(4)] == ['a', 'b', 'a', 'b']
+
+    router.mark_down('a')
+    assert [router.choose() for _ in range(2)] == ['b', 'b']
@@ -0,0 +1,60 @@
+import threading
+
+from app import health
+
+
+def test_healthz(client):
+    response = client.get('/healthz')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ok'}
+
+
+def test_readyz_reports_databases_and_queues(client):
+    response = client.get('/readyz')
+    assert response.status_code == 200
+
+    report = response.get_json()
+    assert report['status'] == 'ok'
+    assert report['databases']['primary']['status'] == 'ok'
+    assert 'pool' in report['databases']['primary']
+    assert report['mail']['breaker']['state'] == 'closed'
+    assert report['queues']['audit']['pending'] == 0
+    assert report['caches']['revoked_tokens'] == 0
+
+
+def test_readyz_is_cached(app, client, monkeypatch):
+    pings = []
+    monkeypatch.setattr(health, 'ping', pings.append)
+
+    first = client.get('/readyz').get_json()
+    second = client.get('/readyz').get_json()
+    assert len(pings) == 1
+    assert first['checked_at'] == second['checked_at']
+
+    app.extensions['readiness'].cache_ttl = 0
+    client.get('/readyz')
+    assert len(pings) == 2
+
+
+def test_readyz_fails_when_database_hangs(app, client, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(health, 'ping', lambda engine: release.wait())
+    probe = app.extensions['readiness']
+    probe.db_timeout = 0.05
+
+    response = client.get('/readyz')
+    release.set()
+    assert response.status_code == 503
+    primary = response.get_json()['databases']['primary']
+    assert primary['status'] == 'fail' and primary['error'] == 'timeout'
+
+
+def test_open_mail_breaker_degrades_readiness(app, client):
+    breaker = app.extensions['mail_breaker']
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'degraded'
+    assert response.get_json()['mail']['status'] == 'degraded'
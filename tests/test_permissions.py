@@ -0,0 +1,62 @@
+import pytest
+
+from app.extensions import db
+from app.models import User
+from app.permissions import Permission, compile_role_masks, permission_required
+
+
+def test_compile_role_masks():
+    masks = compile_role_masks({'user': ['VIEW_PROFILE'], 'admin': ['VIEW_PROFILE', 'ADMIN']})
+    assert masks == {'user': 1, 'admin': 5}
+
+
+def test_compile_role_masks_unknown_permission():
+    with pytest.raises(ValueError):
+        compile_role_masks({'user': ['FLY']})
+
+
+def test_user_permissions(app):
+    user = User(username='denis', email='denis@example.com', role='moderator')
+    assert user.has_permission(Permission.MANAGE_USERS)
+    assert not user.has_permission(Permission.ADMIN)
+
+    user.role = 'admin'
+    assert user.has_permission(Permission.ADMIN)
+
+    user.role = 'unknown'
+    assert user.permissions == 0
+
+
+def login(client, app, role):
+    user = User(username='denis', email='denis@example.com', is_confirmed=True, role=role)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+    client.post('/user/login', data={'email': 'denis@example.com', 'password': 'Pass1234'})
+
+
+@pytest.fixture
+def admin_app(app):
+    @permission_required(Permission.MANAGE_USERS)
+    def manage():
+        return 'ok'
+
+    app.add_url_rule('/manage', 'manage', manage)
+    return app
+
+
+def test_permission_required_anonymous_redirects(admin_app, client):
+    response = client.get('/manage')
+    assert response.status_code == 302
+    assert '/user/login' in response.location
+
+
+def test_permission_required_forbidden(admin_app, client):
+    login(client, admin_app, 'user')
+    assert client.get('/manage').status_code == 403
+    assert client.get('/profile').status_code == 200
+
+
+def test_permission_required_allowed(admin_app, client):
+    login(client, admin_app, 'moderator')
+    assert client.get('/manage').data == b'ok'
@@ -0,0 +1,99 @@
+import gc
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+import urllib.request
+import weakref
+
+import pytest
+
+from app import create_app
+from app.server import PreforkServer, warm_up
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import logging, sys
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+from app import create_app
+from app.extensions import db
+from app.server import PreforkServer, serve
+
+def factory():
+    app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'SECRET_KEY': 'test'})
+    with app.app_context():
+        db.create_all()
+    return app
+
+if len(sys.argv) > 2:
+    PreforkServer._run_worker = lambda *_: sys.exit('broken worker')
+serve(factory, '127.0.0.1:0', workers=2, graceful_timeout=5)
+"""
+
+
+def test_warm_up_compiles_templates_and_opens_connections(app):
+    app.jinja_env.cache.clear()
+    warm_up(app, connections=1)
+    assert len(app.jinja_env.cache) == len(app.jinja_env.list_templates())
+
+
+def test_released_app_is_collected():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+    ref = weakref.ref(app)
+    PreforkServer._release_app(app)
+    del app
+    gc.collect()
+    assert ref() is None
+
+
+class ServerProcess:
+    def __init__(self, db_uri, *args):
+        self.proc = subprocess.Popen([sys.executable, '-c', CHILD, db_uri, *args], cwd=ROOT,
+                                     stderr=subprocess.PIPE, text=True)
+        self.lines = queue.Queue()
+        threading.Thread(target=lambda: [self.lines.put(line) for line in self.proc.stderr], daemon=True).start()
+
+    def wait_for(self, pattern, timeout=15):
+        while True:
+            line = self.lines.get(timeout=timeout)
+            match = re.search(pattern, line)
+            if match:
+                return match
+
+    def get(self, port, path):
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as response:
+            return response.status
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='нужен fork')
+def test_prefork_server_reloads_without_downtime(tmp_path):
+    server = ServerProcess(f"sqlite:///{tmp_path / 'server.db'}")
+    try:
+        port = server.wait_for(r'слушает 127\.0\.0\.1:(\d+)').group(1)
+        server.wait_for('Воркеры готовы')
+        assert server.get(port, '/healthz') == 200
+
+        server.proc.send_signal(signal.SIGHUP)
+        server.wait_for('Воркеры готовы')
+        assert server.get(port, '/user/login') == 200
+
+        server.proc.send_signal(signal.SIGTERM)
+        assert server.proc.wait(timeout=15) == 0
+    finally:
+        if server.proc.poll() is None:
+            server.proc.kill()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='нужен fork')
+def test_prefork_server_exits_when_workers_fail_to_start(tmp_path):
+    server = ServerProcess(f"sqlite:///{tmp_path / 'server.db'}", 'broken')
+    try:
+        server.wait_for('воркеры не поднялись')
+        assert server.proc.wait(timeout=15) == 1
+    finally:
+        if server.proc.poll() is None:
+            server.proc.kill()
@@ -0,0 +1,175 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.admin import fetch_page, select_users_page
+from app.background import stop_background
+from app.extensions import db
+from app.models import User, UserDirectory
+from app.routes import get_user_by_email, load_user
+from app.sharding import _email_criterion, shard_for_email, user_session
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "USER_SHARD_URIS": [f"sqlite:///{tmp_path / f'users_{i}.db'}" for i in range(3)],
+        "WTF_CSRF_ENABLED": False,
+        "SERVER_NAME": "localhost"
+    })
+
+    with app.app_context():
+        db.create_all()
+        app.extensions['user_shards'].create_tables()
+        yield app
+        stop_background(app)
+        db.session.remove()
+
+
+def register(client, username, email):
+    return client.post('/user/register', data={
+        'username': username,
+        'email': email,
+        'password': 'Pass1234',
+        'confirm_password': 'Pass1234'
+    }, follow_redirects=True)
+
+
+def rows_per_shard(app):
+    rows = []
+    for engine in app.extensions['user_shards'].engines.values():
+        with engine.connect() as conn:
+            rows.append(conn.execute(select(User.email)).scalars().all())
+    return rows
+
+
+def test_shard_for_email_is_stable_and_normalized():
+    assert shard_for_email(' Denis@Example.com', 8) == shard_for_email('denis@example.com', 8)
+    assert len({shard_for_email(f'user{i}@example.com', 4) for i in range(100)}) == 4
+
+
+def test_email_criterion():
+    assert _email_criterion(select(User).where(User.email == 'a@b.c')) == 'a@b.c'
+    assert _email_criterion(select(User).where(User.email == 'a@b.c', User.role == 'user')) == 'a@b.c'
+    assert _email_criterion(select(User).where((User.email == 'a@b.c') | (User.username == 'a'))) is None
+
+
+def test_register_writes_to_one_shard(sharded_app):
+    client = sharded_app.test_client()
+    emails = [f'user{i}@example.com' for i in range(6)]
+    for i, email in enumerate(emails):
+        assert 'Спасибо за регистрацию'.encode('utf-8') in register(client, f'user{i}', email).data
+
+    shards = rows_per_shard(sharded_app)
+    assert sorted(sum(shards, [])) == emails
+    for email in emails:
+        assert email in shards[shard_for_email(email, 3)]
+
+    user = get_user_by_email('user3@example.com')
+    assert load_user(str(user.id)).email == 'user3@example.com'
+
+
+def test_username_is_unique_across_shards(sharded_app):
+    client = sharded_app.test_client()
+    register(client, 'denis', 'denis@example.com')
+    response = register(client, 'denis', 'other@example.com')
+
+    assert 'уже существует'.encode('utf-8') in response.data
+    assert db.session.query(UserDirectory).count() == 1
+
+
+def test_reset_password_on_shard(sharded_app):
+    client = sharded_app.test_client()
+    register(client, 'denis', 'denis@example.com')
+    token = get_user_by_email('denis@example.com').get_reset_token()
+
+    response = client.post(f'/user/reset_password/{token}', data={
+        'password': 'Newpass123',
+        'confirm_password': 'Newpass123'
+    }, follow_redirects=True)
+    assert 'пароль был успешно обновлён'.encode('utf-8') in response.data
+
+    user_session().expire_all()
+    assert User.verify_reset_token(token) is None
+    assert get_user_by_email('denis@example.com').check_password('Newpass123')
+
+
+def test_failed_shard_commit_keeps_the_link_usable(sharded_app):
+    client = sharded_app.test_client()
+    register(client, 'denis', 'denis@example.com')
+    token = get_user_by_email('denis@example.com').get_reset_token()
+    data = {'password': 'Newpass123', 'confirm_password': 'Newpass123'}
+    shards = sharded_app.extensions['user_shards']
+
+    locked = OperationalError('COMMIT', {}, Exception('database is locked'))
+    with patch.object(shards.session, 'commit', side_effect=locked):
+        response = client.post(f'/user/reset_password/{token}', data=data, follow_redirects=True)
+    assert 'Не удалось обновить пароль'.encode('utf-8') in response.data
+    assert len(sharded_app.extensions['token_revocations']) == 0
+
+    response = client.post(f'/user/reset_password/{token}', data=data, follow_redirects=True)
+    assert 'пароль был успешно обновлён'.encode('utf-8') in response.data
+    user_session().expire_all()
+    assert get_user_by_email('denis@example.com').check_password('Newpass123')
+
+
+def test_shard_cache_is_bounded(sharded_app):
+    client = sharded_app.test_client()
+    for i in range(3):
+        register(client, f'user{i}', f'user{i}@example.com')
+    shards = sharded_app.extensions['user_shards']
+    shards.cache_size = 2
+    shards.forget()
+
+    ids = db.session.execute(select(UserDirectory.id).order_by(UserDirectory.id)).scalars().all()
+    expected = {user_id: shards.shard_of_id(user_id) for user_id in ids}
+    assert list(shards._shard_by_id) == ids[1:]
+    assert {user_id: shards.shard_of_id(user_id) for user_id in ids} == expected
+
+
+def test_admin_page_merges_shards(sharded_app):
+    client = sharded_app.test_client()
+    for i in range(6):
+        register(client, f'user{i}', f'user{i}@example.com')
+
+    first = fetch_page(select_users_page(limit=4), 4)
+    assert [user.username for user in first] == ['user0', 'user1', 'user2', 'user3']
+    rest = fetch_page(select_users_page(after=first[-1].id, limit=4), 4)
+    assert [user.username for user in rest] == ['user4', 'user5']
+
+
+def test_activity_flush_updates_right_shard(sharded_app):
+    client = sharded_app.test_client()
+    register(client, 'denis', 'denis@example.com')
+    user = get_user_by_email('denis@example.com')
+
+    tracker = sharded_app.extensions['activity']
+    tracker.touch(user.id, login=True)
+    tracker.flush()
+
+    user_session().expire_all()
+    assert get_user_by_email('denis@example.com').last_login_at is not None
+
+
+def test_rebalance(sharded_app):
+    client = sharded_app.test_client()
+    sharded_app.extensions['user_shards'].shard_count = 2
+    emails = [f'user{i}@example.com' for i in range(10)]
+    for i, email in enumerate(emails):
+        register(client, f'user{i}', email)
+    assert rows_per_shard(sharded_app)[2] == []
+
+    sharded_app.extensions['user_shards'].shard_count = 3
+    result = sharded_app.test_cli_runner().invoke(args=['shards', 'rebalance'])
+    assert result.exit_code == 0, result.output
+
+    shards = rows_per_shard(sharded_app)
+    assert sorted(sum(shards, [])) == emails
+    for email in emails:
+        assert email in shards[shard_for_email(email, 3)]
+        assert get_user_by_email(email) is not None
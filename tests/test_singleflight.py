@@ -0,0 +1,101 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.extensions import db
+from app.models import User
+from app.singleflight import SingleFlight, flight_key
+
+
+def run_concurrently(flights, key, fn, count=5):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do(key, fn))) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight(ttl=5)
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(1)
+        return 'sent'
+
+    threads, results = run_concurrently(flights, ('reset', 'a@example.com'), work)
+    while flights.metrics()['shared'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ['sent'] * 5
+
+
+def test_outcome_is_memoized_for_ttl():
+    flights = SingleFlight(ttl=5)
+    calls = []
+    key = ('confirm', 'a@example.com')
+
+    assert flights.do(key, lambda: calls.append(1) or True) is True
+    assert flights.do(key, lambda: calls.append(1) or True) is True
+    assert calls == [1] and flights.memo_hits == 1
+
+    flights.ttl = 0
+    flights.do(('confirm', 'b@example.com'), lambda: None)
+    flights.do(('confirm', 'b@example.com'), lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_errors_reach_waiters_and_are_not_memoized():
+    flights = SingleFlight(ttl=5)
+    key = ('reset', 'a@example.com')
+
+    def fail():
+        raise RuntimeError('db down')
+
+    with pytest.raises(RuntimeError):
+        flights.do(key, fail)
+    assert flights.do(key, lambda: 'retried') == 'retried'
+
+
+def test_key_uses_email_as_looked_up():
+    assert flight_key('reset', 'denis@example.com') == flight_key('reset', 'denis@example.com')
+    assert flight_key('reset', 'Denis@Example.COM') != flight_key('reset', 'denis@example.com')
+
+
+def test_repeated_reset_requests_send_one_email(app):
+    user = User(username='denis', email='denis@example.com', is_confirmed=True)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+
+    with patch('app.routes.send_reset_password_email', return_value=True) as send:
+        # Разные клиенты: проверка по cookie-сессии их не останавливает
+        for _ in range(2):
+            response = app.test_client().post('/user/reset_password', data={'email': 'denis@example.com'},
+                                              follow_redirects=True)
+            assert 'отправлено на вашу почту'.encode('utf-8') in response.data
+    assert send.call_count == 1
+
+
+def test_other_spelling_does_not_reuse_outcome(app):
+    user = User(username='denis', email='denis@example.com', is_confirmed=True)
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+
+    with patch('app.routes.send_reset_password_email', return_value=True) as send:
+        # Поиск регистрозависим: для DENIS@ пользователь не найден, и этот исход
+        # не должен подменять ответ на запрос с точным адресом
+        app.test_client().post('/user/reset_password', data={'email': 'DENIS@example.com'})
+        response = app.test_client().post('/user/reset_password', data={'email': 'denis@example.com'},
+                                          follow_redirects=True)
+        assert 'отправлено на вашу почту'.encode('utf-8') in response.data
+    assert send.call_count == 1
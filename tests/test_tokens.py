@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+from app.models import User, RevokedToken, RESET_TOKEN_SALT
+from app.tokens import RevocationStore
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def make_user():
+    user = User(username='denis', email='denis@example.com')
+    user.set_password('Pass1234')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def reset_password(client, token):
+    return client.post(f'/user/reset_password/{token}', data={
+        'password': 'Newpass123',
+        'confirm_password': 'Newpass123'
+    }, follow_redirects=True)
+
+
+def test_reset_token_is_single_use(client, app):
+    token = make_user().get_reset_token()
+
+    assert 'пароль был успешно обновлён'.encode('utf-8') in reset_password(client, token).data
+    assert 'недействительна или устарела'.encode('utf-8') in reset_password(client, token).data
+    assert db.session.execute(select(RevokedToken)).scalars().one()
+
+
+def test_revoked_token_rejected_before_user_lookup(client, app):
+    token = make_user().get_reset_token()
+    reset_password(client, token)
+
+    with patch.object(db.session, 'get') as mock_get:
+        assert User.verify_reset_token(token) is None
+        mock_get.assert_not_called()
+
+
+def test_token_used_by_another_process_is_rejected(client, app):
+    token = make_user().get_reset_token()
+    jti = User.load_token(token, RESET_TOKEN_SALT)['jti']
+    # Другой процесс уже записал отзыв, а индекс в памяти этого процесса о нем не знает
+    with db.engine.begin() as conn:
+        conn.execute(insert(RevokedToken.__table__).values(
+            jti=jti, expires_at=utcnow() + timedelta(hours=1), revoked_at=utcnow()))
+
+    response = reset_password(client, token)
+    assert 'недействительна или устарела'.encode('utf-8') in response.data
+    assert User.verify_reset_token(token) is None
+
+
+def test_confirm_token_is_not_a_reset_token(app):
+    user = make_user()
+    assert User.verify_reset_token(user.get_email_confirm_token()) is None
+    assert User.verify_email_confirm_token(user.get_email_confirm_token()).id == user.id
+
+
+def test_refresh_loads_new_and_prunes_expired(app):
+    now = utcnow()
+    with db.engine.begin() as conn:
+        conn.execute(insert(RevokedToken.__table__), [
+            {'jti': 'live', 'expires_at': now + timedelta(hours=1), 'revoked_at': now},
+            {'jti': 'expired', 'expires_at': now - timedelta(seconds=1), 'revoked_at': now},
+        ])
+
+    store = RevocationStore(app)
+    assert store.is_revoked('live')
+    assert not store.is_revoked('expired')
+    # Удаление истекших идет в фоновом сбросе, а не при проверке токена
+    assert len(db.session.execute(select(RevokedToken.jti)).scalars().all()) == 2
+
+    store.remember('gone', now - timedelta(seconds=1))
+    store.flush()
+    assert db.session.execute(select(RevokedToken.jti)).scalars().all() == ['live']
+    assert len(store) == 1
+
+
+def test_refresh_reads_rows_committed_out_of_order(app):
+    now = utcnow()
+    store = RevocationStore(app)
+    with db.engine.begin() as conn:
+        conn.execute(insert(RevokedToken.__table__).values(
+            jti='later', expires_at=now + timedelta(hours=1), revoked_at=now))
+    assert store.is_revoked('later')
+
+    # Отметка времени поставлена раньше, но транзакция зафиксирована позже
+    with db.engine.begin() as conn:
+        conn.execute(insert(RevokedToken.__table__).values(
+            jti='earlier', expires_at=now + timedelta(hours=1), revoked_at=now - timedelta(seconds=5)))
+    store.refresh_soon()
+    assert store.is_revoked('earlier')
+
+
+def test_database_error_while_checking_token_is_reported(client, app):
+    token = make_user().get_reset_token()
+    store = app.extensions['token_revocations']
+    store.refresh_soon()
+
+    with patch.object(store, '_refresh', side_effect=OperationalError('SELECT', {}, Exception('locked'))):
+        response = client.get(f'/user/reset_password/{token}', follow_redirects=True)
+    assert response.status_code == 200
+    assert 'ошибка при подключении'.encode('utf-8') in response.data
+
+
+def test_failed_commit_keeps_the_link_usable(client, app):
+    token = make_user().get_reset_token()
+
+    with patch('app.routes.commit_users', side_effect=OperationalError('COMMIT', {}, Exception('database is locked'))):
+        assert 'Не удалось обновить пароль'.encode('utf-8') in reset_password(client, token).data
+    assert 'пароль был успешно обновлён'.encode('utf-8') in reset_password(client, token).data
+    assert 'недействительна или устарела'.encode('utf-8') in reset_password(client, token).data